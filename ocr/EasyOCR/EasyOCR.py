@@ -1,15 +1,18 @@
 import glob
 import os
 import sys
-import easyocr
+import time
+import threading
 import cv2
-import numpy as np
 import easygui
 import Modules.config as config
 import Modules.path as path 
 from PIL import Image, ImageDraw, ImageFont
 from matplotlib import pyplot as plt
-from Modules.json_processing import clear_data, to_json, create_json, save_json
+from multiprocessing import Pool, cpu_count
+from Modules.json_processing import ReceiptParser
+from Modules.writer import get_writer, flush_writer
+from Modules.tokens import OCRToken, write_ocr_txt
 
 # === Pasta de resultados ===
 RESULT_DIR = path.results
@@ -23,24 +26,33 @@ def help_menu():
     EasyOCR — Ferramenta de extração de texto de imagens por via de comando ou por interface gráfica.
 
     Uso:
-        python3 EasyOCR.py [imagem|diretório]    
+        python3 EasyOCR.py [imagem|diretório] [opções]
         python3 EasyOCR.py --help
 
+    Opções:
+        --workers N      Processa as imagens em lote com N processos paralelos (cada um carrega seu próprio Reader).
+        --notxt          Desativa a saída em .txt (os tokens seguem em memória para o JSON).
+        --render MODO    Plotagem: full (padrão, grava a imagem plotada em segundo plano), lazy (apenas quando exibida no EasyGUI) ou none.
+        --no-plot        Equivalente a --render none: nenhuma figura, plotagem ou PNG.
+
     Exemplos:
         python3 EasyOCR.py
         python3 EasyOCR.py foto.jpg
         python3 EasyOCR.py pasta/
+        python3 EasyOCR.py pasta/ --no-plot
+        python3 EasyOCR.py pasta/ --workers 4
     """)
     exit()
 
 # === Função principal de OCR ===
-def process_image(img_path, its_console=False):
+def process_image(img_path, its_console=False, render="full", txtoutput=True, reader=None):
 
     img_name = os.path.basename(img_path)
     name_no_ext = os.path.splitext(img_name)[0]
 
-    # Carrega OCR com base nos dicionarios de lingua portuguesa e inglesa
-    reader = easyocr.Reader(['pt', 'en'])
+    # OCR com base nos dicionarios de lingua portuguesa e inglesa, carregado uma única vez por processo
+    if reader is None:
+        reader = config.get_reader()
 
     try:
         result = reader.readtext(img_path, detail=1)
@@ -48,6 +60,45 @@ def process_image(img_path, its_console=False):
         print(f"[ERRO] Falha no EasyOCR: {e}")
         return
 
+    # Tokens em memória (texto, score e bbox), usados no JSON, no .txt e na plotagem
+    tokens = []
+    for bbox, text, score in result:
+        # Mesma estrutura do Paddle (foi a referencia para esta implementação)
+        tokens.append(OCRToken(text, score, bbox[0][0], bbox[0][1], bbox[2][0], bbox[2][1]))
+
+    # Arquivo TXT, gravado em segundo plano (não é mais lido de volta)
+    if txtoutput:
+        txt_output = os.path.join(RESULT_DIR, f"{name_no_ext}_EasyOCR.txt")
+        get_writer().submit(write_ocr_txt, tokens, txt_output)
+        print(f"[OK] TXT salvo em:      {os.path.abspath(txt_output)}")
+
+    linhas = config.reorder_tokens(tokens)    # Reordena os tokens baseado na posição Y para formar linhas ordenadas
+            
+    parser = ReceiptParser()  # Parser próprio desta imagem, sem estado compartilhado com as demais
+    parser.parse([t.text.strip() for t in linha] for linha in linhas)
+    json_name = f"{name_no_ext}_EasyOCR_JsonProcessing"
+    parser.save_json(filename=json_name, output_dir=RESULT_DIR)
+
+    # === Plotagem ===
+    # none: nenhuma plotagem; lazy: plota só quando a imagem será exibida (EasyGUI); full: sempre grava a imagem plotada
+    plot_output = os.path.join(RESULT_DIR, f"{name_no_ext}_EasyOCR_plotagem.png")
+    show = not its_console and render != "none"    # A figura do Matplotlib só é construída quando for exibida
+
+    if show:
+        img_pil = draw_overlay(img_path, tokens)    # Renderiza agora, pois a imagem será exibida em seguida
+        get_writer().submit(save_plot, img_pil, plot_output)
+        print(f"[OK] Imagem salva em:   {os.path.abspath(plot_output)}")
+        plt.figure(figsize=(12, 16))
+        plt.imshow(img_pil)
+        plt.title(f"OCR: {img_name}")
+        plt.axis("off")
+        plt.show()
+    elif render == "full":                          # Leitura, plotagem e gravação do PNG ficam na thread de escrita
+        get_writer().submit(render_plot, img_path, tokens, plot_output)
+        print(f"[OK] Imagem salva em:   {os.path.abspath(plot_output)}")
+
+# === Desenha as caixas e os textos reconhecidos sobre a imagem ===
+def draw_overlay(img_path, tokens):
     # Carrega imagem para desenhar com PIL
     img_cv = cv2.imread(img_path)
     img_rgb = cv2.cvtColor(img_cv, cv2.COLOR_BGR2RGB)
@@ -58,66 +109,68 @@ def process_image(img_path, its_console=False):
     font_path = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
     font = ImageFont.truetype(font_path, 22)
 
-    # Arquivo TXT
-    txt_output = os.path.join(RESULT_DIR, f"{name_no_ext}_EasyOCR.txt")
-    raw_text = ""
-
-    with open(txt_output, "w", encoding="utf-8") as f_txt:
-
-        for bbox, text, score in result:
-            x0 = int(bbox[0][0])
-            y0 = int(bbox[0][1])
-            x1 = int(bbox[2][0])
-            y1 = int(bbox[2][1])
+    for t in tokens:
+        # Desenhar retângulo baseado na pontuação de score.
+        if t.score >= 0.85:
+            draw.rectangle([t.x, t.y, t.x2, t.y2], outline=(0, 255, 0), width=3)
+        else:
+            draw.rectangle([t.x, t.y, t.x2, t.y2], outline=(255, 0, 0), width=3)
 
-            # Linha estilo Paddle (foi a referencia para esta implementação)
-            line = f"OCR='{text}', score={score:.2f}, bbox=[{x0},{y0},{x1},{y1}]\n"
+        # Texto acima do box
+        draw.text((t.x, t.y - 28), t.text, fill=(255, 255, 255), font=font, stroke_width=1, stroke_fill=(0,0,0))
 
-            f_txt.write(line)
-            raw_text += line
+    return img_pil
 
-            # Desenhar retângulo baseado na pontuação de score.
-            if score >= 0.85:
-                draw.rectangle([x0, y0, x1, y1], outline=(0, 255, 0), width=3)
-            else:
-                draw.rectangle([x0, y0, x1, y1], outline=(255, 0, 0), width=3)
-
-            # Texto acima do box
-            draw.text((x0, y0 - 28), text, fill=(255, 255, 255), font=font, stroke_width=1, stroke_fill=(0,0,0))
-
-    # Imagem final
-    plot_output = os.path.join(RESULT_DIR, f"{name_no_ext}_EasyOCR_plotagem.png")
+# === Tarefas executadas pela thread de escrita ===
+def save_plot(img_pil, plot_output):
     img_pil.save(plot_output)
 
-    tokens = config.parse_ocr_txt(txt_output) # Parse para extrair os tokens do arquivo txt
-    linhas = config.reorder_tokens(tokens)    # Reordena os tokens baseado na posição Y para formar linhas ordenadas
-            
-    clear_data()  # Garantir JSON limpo
-    for linha in linhas:
-        palavras_linha = [t["text"] for t in linha]
-        to_json(palavras_linha)  
-    create_json()
-    json_name = f"{name_no_ext}_EasyOCR_JsonProcessing"
-    save_json(filename=json_name, output_dir=RESULT_DIR)
-
-    print(f"[OK] TXT salvo em:      {os.path.abspath(txt_output)}")
-    print(f"[OK] Imagem salva em:   {os.path.abspath(plot_output)}")
-
-    # Se o processamento não for via console, mostra a imagem plotada
-    if not its_console:
-        plt.figure(figsize=(12, 16))
-        plt.imshow(img_pil)
-        plt.title(f"OCR: {img_name}")
-        plt.axis("off")
-        plt.show()
+def render_plot(img_path, tokens, plot_output):
+    save_plot(draw_overlay(img_path, tokens), plot_output)
 
 # === Carregar imagens do sistema ===
-def load_image(img_paths, its_console):
+def load_image(img_paths, its_console, render="full", txtoutput=True, workers=1):
     print(f"[INFO] Processando {len(img_paths)} imagem(ns)...")
+    start_time = time.time()
 
-    for img in img_paths:
-        print(f"\n[PROCESSANDO] {img}")
-        process_image(img, its_console)
+    if workers > 1 and len(img_paths) > 1:  # Modo em lote: um Pool de processos, cada um com seu próprio Reader aquecido
+        process_batch(img_paths, render, txtoutput, workers)
+    else:
+        for img in img_paths:
+            print(f"\n[PROCESSANDO] {img}")
+            process_image(img, its_console, render, txtoutput)
+
+    flush_writer()  # Aguarda as imagens plotadas ainda em gravação
+    print(f"[INFO] Tempo total: {time.time() - start_time:.2f} segundos")
+
+# === Inicializador de cada worker do Pool: divide os núcleos e carrega o Reader uma única vez ===
+def init_worker(cpu_threads):
+    import torch
+    torch.set_num_threads(cpu_threads)
+    config.get_reader()
+
+# === Processa as imagens em paralelo com número limitado de imagens em voo ===
+def process_batch(img_paths, render, txtoutput, workers):
+    n_workers = min(workers, len(img_paths))
+    cpu_threads = max(1, cpu_count() // n_workers)
+    in_flight = threading.BoundedSemaphore(2 * n_workers)  # No máximo duas imagens por worker aguardando ou em processamento
+
+    def done(_):
+        in_flight.release()
+
+    def failed(e):
+        print(f"[ERRO] Falha ao processar imagem: {e}")
+        in_flight.release()
+
+    print(f"[INFO] Modo em lote com {n_workers} workers ({cpu_threads} threads cada)")
+
+    with Pool(n_workers, initializer=init_worker, initargs=(cpu_threads,)) as pool:
+        for img in img_paths:
+            in_flight.acquire()
+            # Os workers nunca exibem a plotagem (its_console=True), pois não há janela nos processos filhos
+            pool.apply_async(process_image, (img, True, render, txtoutput), callback=done, error_callback=failed)
+        pool.close()
+        pool.join()
 
 # === MAIN ===
 def main():
@@ -127,6 +180,35 @@ def main():
     if '--help' in args or '-h' in args:
         help_menu()
 
+    # === Modo em lote ===
+    workers = 1
+    if '--workers' in args:
+        idx = args.index('--workers')
+        if idx + 1 >= len(args) or not args[idx + 1].isdigit():
+            print("Número de workers inválido (use --workers N).")
+            exit()
+        workers = max(1, int(args[idx + 1]))
+        del args[idx:idx + 2]
+
+    # === Saída em .txt ===
+    txtoutput = True
+    if '--notxt' in args:
+        txtoutput = False
+        args.remove('--notxt')
+
+    # === Modo de plotagem ===
+    render = "full"
+    if '--no-plot' in args:
+        render = "none"
+        args.remove('--no-plot')
+    elif '--render' in args:
+        idx = args.index('--render')
+        if idx + 1 >= len(args) or args[idx + 1] not in ("none", "lazy", "full"):
+            print("Modo de plotagem inválido (use --render none, lazy ou full).")
+            exit()
+        render = args[idx + 1]
+        del args[idx:idx + 2]
+
     # === Há argumentos? ===
     if args:
         img_paths = []
@@ -153,7 +235,7 @@ def main():
         print("Nenhuma imagem selecionada.")
         exit()
     
-    load_image(img_paths, its_console)
+    load_image(img_paths, its_console, render, txtoutput, workers)
 
 # ============================================================
 if __name__ == "__main__":
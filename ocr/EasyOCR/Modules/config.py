@@ -1,65 +1,125 @@
-import re
+import numpy as np
+from Modules.tokens import parse_ocr_txt    # Leitura do .txt mantida aqui por compatibilidade
 
-def parse_ocr_txt(txt_file): #
+# === Configurações do EasyOCR ===
+READER_LANGS = ['pt', 'en']     # Dicionarios de lingua portuguesa e inglesa
+READER_OPTIONS = {}             # Opções extras do easyocr.Reader (ex.: gpu=False)
+
+_readers = {}   # Cache de easyocr.Reader do processo atual, chaveado pelas línguas e opções
+
+def get_reader(langs=None, **options):
     """
-    Lê o txt salvo pelo OCR e retorna uma lista de dicionários:
-    [
-      {"text": "ARROZ", "score": 0.95, "x": 120, "y": 200},
-      ...
-    ]
+    Retorna o easyocr.Reader do processo atual para as línguas/opções informadas, construindo-o apenas na primeira chamada.
+    Evita recarregar o detector CRAFT e os pesos do reconhecedor a cada imagem; cada worker do Pool mantém o seu próprio cache.
     """
-    pattern = r"OCR='(.*?)', score=([\d.]+), bbox=\[(\d+),(\d+),(\d+),(\d+)\]" # Regex para extrair texto, score e bounding box do .txt
-    tokens = [] # Palavras extraidas
-
-    with open(txt_file, "r", encoding="utf-8") as f: # Abrir arquivo txt apenas como leitura
-        for line in f:
-            match = re.search(pattern, line)
-            if match:
-                text = match.group(1).strip()     # Extrai o texto
-                score = float(match.group(2))     # Extrai o score e converte para float
-                x0 = int(match.group(3))          # coordenada x0
-                y0 = int(match.group(4))          # coordenada y0
-                x1 = int(match.group(5))          # coordenada x1
-                y1 = int(match.group(6))          # coordenada y1
-
-                tokens.append({                   # Informações extraidas adicionadas na lista de tokens
-                    "text": text,                   
-                    "score": score,
-                    "x": x0,
-                    "y": y0,
-                    "x2": x1,
-                    "y2": y1
-                })
-
-    return tokens                                 # Retorna os tokens do arquivo txt
-
-
-def reorder_tokens(tokens, line_threshold=5):
+    langs = READER_LANGS if langs is None else langs
+    options = {**READER_OPTIONS, **options}
+    key = (tuple(langs), tuple(sorted(options.items())))
+
+    reader = _readers.get(key)
+    if reader is None:
+        import easyocr      # Importação tardia, o processo principal do modo em lote não precisa carregar o EasyOCR
+        reader = easyocr.Reader(list(langs), **options)
+        _readers[key] = reader
+    return reader
+
+# === Motor de agrupamento em linhas (NumPy), usado pelo reorder_tokens ===
+MAX_SKEW_SLOPE = 0.14  # Inclinação máxima compensada pelo deskew (~8 graus)
+SKEW_WINDOW = 16       # Vizinhos (na ordem vertical) comparados com cada token na estimativa da inclinação
+SKEW_REFINE = 0.03     # Faixa de busca do refinamento da inclinação em torno da estimativa
+SKEW_SAMPLE = 2000     # Máximo de tokens (faixa vertical contínua) usados no refinamento
+
+def _line_ids(keys_y, x, limits):
+    # Ordena por (y, x) e inicia uma nova linha sempre que o salto vertical entre tokens consecutivos passa do limite
+    order = np.lexsort((x, keys_y))                                     # lexsort é estável: empates mantêm a ordem original
+    breaks = np.diff(keys_y[order]) > limits(order)
+    return order, np.concatenate(([0], np.cumsum(breaks)))
+
+def _estimate_slope(boxes, xc, yc, heights):
+    # Inclinação mediana entre tokens vizinhos da mesma linha: pares próximos em y (ordem vertical),
+    # com diferença vertical menor que a altura e espaço horizontal entre as caixas de no máximo 2 alturas
+    order = np.argsort(yc, kind="stable")
+    slopes = []
+    for offset in range(1, min(SKEW_WINDOW, len(order) - 1) + 1):
+        i, j = order[:-offset], order[offset:]
+        dx = xc[j] - xc[i]
+        dy = yc[j] - yc[i]
+        gap = np.maximum(boxes[j, 0] - boxes[i, 2], boxes[i, 0] - boxes[j, 2])
+        h = np.minimum(heights[i], heights[j])
+        pair = (np.abs(dy) < h) & (gap < 2 * h) & (np.abs(dx) > h)
+        slopes.append(dy[pair] / dx[pair])
+
+    slopes = np.concatenate(slopes) if slopes else np.empty(0)
+    slopes = slopes[np.abs(slopes) <= MAX_SKEW_SLOPE]
+    if len(slopes) == 0:
+        return 0.0
+    return _refine_slope(float(np.median(slopes)), xc[order], yc[order], heights)
+
+def _refine_slope(slope, xc, yc, heights):
+    # Refinamento por perfil de projeção perto da estimativa: a inclinação que concentra os centros em menos faixas horizontais.
+    # A busca é local (+-SKEW_REFINE) para não cair em inclinações "fantasmas" que alinham colunas de linhas diferentes
+    if len(yc) > SKEW_SAMPLE:                                           # Em documentos grandes basta uma faixa vertical contínua
+        start = (len(yc) - SKEW_SAMPLE) // 2
+        xc, yc = xc[start:start + SKEW_SAMPLE], yc[start:start + SKEW_SAMPLE]
+
+    offsets = np.linspace(-SKEW_REFINE, SKEW_REFINE, 21)
+    candidates = slope + offsets[np.argsort(np.abs(offsets), kind="stable")]   # Em caso de empate fica a mais próxima da estimativa
+    bin_h = max(float(np.median(heights)) / 4, 1.0)
+
+    proj = yc[None, :] - candidates[:, None] * xc[None, :]             # (candidatos, tokens)
+    bins = ((proj - proj.min(axis=1, keepdims=True)) // bin_h).astype(np.intp)
+    n_bins = int(bins.max()) + 1
+    bins += np.arange(len(candidates))[:, None] * n_bins               # Um histograma por candidato em um único bincount
+    counts = np.bincount(bins.ravel(), minlength=len(candidates) * n_bins).reshape(len(candidates), n_bins)
+    score = (counts.astype(np.float64) ** 2).sum(axis=1)
+    return float(candidates[np.argmax(score)])
+
+def cluster_lines(boxes, overlap=0.5, line_threshold=None, deskew=False):
     """
-    Ordena palavras por coordenadas:
-    1. Ordena por y (vertical)
-    2. Dentro da linha, ordena por x (horizontal)
-    3. Agrupa por linhas usando tolerância
+    Agrupa caixas [x0, y0, x1, y1] em linhas de leitura.
+    - Padrão: tokens ordenados pelo centro vertical; uma nova linha começa quando o centro se afasta do token anterior
+      mais que overlap x altura da menor das duas caixas (tolerância relativa ao tamanho do texto).
+    - line_threshold: modo anterior, com tolerância fixa em pixels sobre o topo (y0) das caixas.
+    - deskew: estima a inclinação do documento e compensa o centro vertical antes de agrupar (apenas no modo padrão).
+    Retorna (order, line_ids): índices das caixas em ordem de leitura e o número da linha de cada uma.
     """
-    tokens = sorted(tokens, key=lambda t: (t["y"], t["x"]))     # Ordena tokens baseado em y e x
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    x = boxes[:, 0]
+
+    if line_threshold is not None:
+        order, ids = _line_ids(boxes[:, 1], x, lambda o: line_threshold)
+    else:
+        heights = np.maximum(boxes[:, 3] - boxes[:, 1], 1.0)
+        xc = (boxes[:, 0] + boxes[:, 2]) / 2
+        yc = (boxes[:, 1] + boxes[:, 3]) / 2
 
-    linhas = []
-    linha_atual = []
-    last_y = None
+        def limits(order):
+            h = heights[order]
+            return overlap * np.minimum(h[1:], h[:-1])
 
-    for token in tokens:                                                 # Percorre todos os tokens 
-        if last_y is None or abs(token["y"] - last_y) <= line_threshold: # Se a diferença do y atual com o último for menor que o valor do threshold
-            linha_atual.append(token)  # adiciona o token na linha atual
-        else:
-            linhas.append(linha_atual) # aduciona a linha atual na lista de linhas   
-            linha_atual = [token]      # inicia uma nova linha atual com o token atual
-        last_y = token["y"]            # Atualiza o last_y com o y do token atual
+        if deskew:
+            yc = yc - _estimate_slope(boxes, xc, yc, heights) * xc             # Compensa a inclinação antes de agrupar
+        order, ids = _line_ids(yc, x, limits)
 
-    if linha_atual:                    # Após o loop, se houver tokens na linha atual   
-        linhas.append(linha_atual)     # adiciona a linha atual na lista de linhas 
+    within = np.lexsort((x[order], ids))                                # Dentro de cada linha, ordena por x (estável)
+    return order[within], ids[within]
+
+def reorder_tokens(tokens, line_threshold=None, overlap=0.5, deskew=False):
+    """
+    Ordena os tokens (OCRToken) em ordem de leitura, usando cluster_lines:
+    1. Agrupa por linhas (tolerância relativa à altura das caixas, ou fixa em pixels com line_threshold)
+    2. Dentro da linha, ordena por x (horizontal)
+    3. Retorna a lista de linhas, cada uma uma lista de tokens
+    """
+    if not tokens:
+        return []
 
-    # Ordena dentro das linhas por X
-    for linha in linhas:
-        linha.sort(key=lambda t: t["x"])
+    boxes = np.fromiter(
+        (c for t in tokens for c in (t.x, t.y, t.x2, t.y2)), dtype=np.float64, count=4 * len(tokens)
+    )
+    order, ids = cluster_lines(boxes, overlap=overlap, line_threshold=line_threshold, deskew=deskew)
 
-    return linhas                      # Retorna as linhas ordenadas baseado no threshold definido
\ No newline at end of file
+    bounds = np.flatnonzero(np.diff(ids)) + 1                           # Posições onde começa uma nova linha
+    return [[tokens[i] for i in linha] for linha in np.split(order, bounds)]
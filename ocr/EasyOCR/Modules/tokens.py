@@ -0,0 +1,71 @@
+'''
+Informações: Módulo tokens.py com a estrutura em memória de um token do OCR (texto, score e bounding box).
+Os tokens passam diretamente do OCR para o reorder_tokens e para o to_json; o arquivo .txt é apenas uma saída opcional,
+gravada e lida pelas funções deste módulo no formato:
+OCR='<texto>', score=<score>, bbox=[x0,y0,x1,y1]
+'''
+
+import re
+
+# Regex de uma linha do .txt. O texto é guloso para terminar no último ", score=" da linha, aceitando aspas dentro do texto
+TOKEN_PATTERN = re.compile(r"OCR='(.*)', score=([\d.]+)(?:, bbox=\[(-?\d+),(-?\d+),(-?\d+),(-?\d+)\])?")
+
+class OCRToken:
+    __slots__ = ("text", "score", "x", "y", "x2", "y2")
+
+    def __init__(self, text, score, x=None, y=None, x2=None, y2=None):
+        self.text = text                                # Texto reconhecido
+        self.score = float(score)                       # Confiança do OCR (ou do corretor ortográfico)
+        self.x = None if x is None else int(x)          # Canto superior esquerdo
+        self.y = None if y is None else int(y)
+        self.x2 = None if x2 is None else int(x2)       # Canto inferior direito
+        self.y2 = None if y2 is None else int(y2)
+
+    def __getitem__(self, key):
+        # Permite o acesso por chave (token["text"]), como nos dicionários usados anteriormente
+        return getattr(self, key)
+
+    def __repr__(self):
+        return f"OCRToken({self.to_line()})"
+
+    def rescale(self, fx, fy):
+        # Converte o bounding box de uma imagem redimensionada (fatores fx, fy em relação à original) para a imagem original
+        if self.x is not None and (fx, fy) != (1.0, 1.0):
+            self.x, self.x2 = round(self.x / fx), round(self.x2 / fx)
+            self.y, self.y2 = round(self.y / fy), round(self.y2 / fy)
+        return self
+
+    def to_line(self):
+        # Formata o token como uma linha do .txt
+        line = f"OCR='{self.text}', score={self.score:.2f}"
+        if self.x is not None:
+            line += f", bbox=[{self.x},{self.y},{self.x2},{self.y2}]"
+        return line
+
+def parse_token_line(line):
+    # Converte uma linha no formato do .txt em OCRToken, ou None se a linha não estiver no formato
+    match = TOKEN_PATTERN.search(line)
+    if not match:
+        return None
+    text, score, x0, y0, x1, y1 = match.groups()
+    return OCRToken(text.strip(), score, x0, y0, x1, y1)
+
+def parse_ocr_lines(lines):
+    # Converte várias linhas em tokens, ignorando as que não estão no formato
+    tokens = []
+    for line in lines:
+        token = parse_token_line(line)
+        if token is not None:
+            tokens.append(token)
+    return tokens
+
+def parse_ocr_txt(txt_file):
+    # Lê o txt salvo pelo OCR e retorna a lista de OCRToken
+    with open(txt_file, "r", encoding="utf-8") as f:
+        return parse_ocr_lines(f)
+
+def write_ocr_txt(tokens, txt_file):
+    # Grava os tokens no .txt, uma linha por token
+    with open(txt_file, "w", encoding="utf-8") as f:
+        for token in tokens:
+            f.write(token.to_line() + "\n")
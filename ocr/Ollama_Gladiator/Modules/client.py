@@ -0,0 +1,161 @@
+'''
+Informações: Módulo client.py com o cliente HTTP da API do Ollama (/api/generate) e o executor das requisições.
+- Uma única requests.Session com pool de conexões: as requisições reaproveitam as conexões TCP com o Ollama;
+- Timeout de conexão, de leitura (tempo máximo sem receber nada) e prazo total por requisição;
+- Novas tentativas com espera exponencial para falhas de conexão, timeouts e respostas 429/5xx;
+- ModelPool: um executor por modelo, com um número configurável de requisições simultâneas para cada modelo e uma janela
+  limitada de tarefas por modelo (modelos rápidos não se adiantam indefinidamente em relação aos lentos);
+- ModelStats: tempos de carregamento e de inferência por modelo, lidos do objeto final (done) de cada resposta.
+'''
+
+import json, os, random, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_URL = os.environ.get("OLLAMA_HOST", "http://localhost:11434")  # Mesma variável de ambiente usada pelo próprio Ollama
+CONNECT_TIMEOUT = 5         # Segundos para abrir a conexão
+REQUEST_TIMEOUT = 600       # Segundos por requisição (inclui o carregamento do modelo na primeira chamada)
+RETRIES = 3                 # Novas tentativas após a primeira falha
+BACKOFF = 1.0               # Espera base (segundos) entre tentativas, dobrando a cada falha
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class OllamaError(Exception):
+    pass
+
+class OllamaClient:
+    def __init__(self, base_url=DEFAULT_URL, timeout=REQUEST_TIMEOUT, retries=RETRIES, backoff=BACKOFF, pool_size=16):
+        if "://" not in base_url:                   # OLLAMA_HOST costuma ser definido sem o esquema (ex.: 127.0.0.1:11434)
+            base_url = f"http://{base_url}"
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)   # Um único host, até pool_size conexões reaproveitadas
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def _open(self, endpoint, payload):
+        # Abre a requisição em streaming, repetindo enquanto a falha for temporária
+        url = f"{self.base_url}{endpoint}"
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.post(url, json=payload, stream=True, timeout=(CONNECT_TIMEOUT, self.timeout))
+                if response.status_code not in RETRY_STATUS:
+                    if response.status_code >= 400:
+                        detail = response.text.strip()
+                        response.close()
+                        raise OllamaError(f"HTTP {response.status_code} em {endpoint}: {detail}")
+                    return response
+                response.close()
+                error = OllamaError(f"HTTP {response.status_code} em {endpoint}")
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+
+            if attempt == self.retries:
+                raise OllamaError(f"{endpoint} falhou após {self.retries + 1} tentativas: {error}")
+            wait = self.backoff * 2 ** attempt * (0.5 + random.random())   # Espera exponencial com variação aleatória
+            print(f"[AVISO] {error}; nova tentativa em {wait:.1f} s")
+            time.sleep(wait)
+
+    def stream(self, endpoint, payload):
+        # Gera os objetos NDJSON da resposta. As novas tentativas valem até a resposta começar; uma falha no meio do
+        # streaming é repassada para quem chamou, para que o texto parcial não seja duplicado
+        deadline = time.monotonic() + self.timeout
+        response = self._open(endpoint, payload)
+        with response:
+            for line in response.iter_lines():
+                if time.monotonic() > deadline:
+                    raise OllamaError(f"{endpoint} excedeu o prazo de {self.timeout} s")
+                if not line:
+                    continue
+                try:
+                    obj = json.loads(line.decode("utf-8"))
+                except ValueError as e:
+                    print("[ERRO DECODIFICAÇÃO NDJSON]", e)
+                    continue
+                if "error" in obj:
+                    raise OllamaError(obj["error"])
+                yield obj
+
+    def generate(self, payload):
+        # Streaming do /api/generate
+        return self.stream("/api/generate", payload)
+
+    def unload(self, model_name):
+        # Descarrega o modelo da memória (keep_alive 0 sem prompt), liberando a GPU/RAM para o próximo modelo
+        for _ in self.generate({"model": model_name, "keep_alive": 0}):
+            pass
+
+class ModelStats:
+    # Soma, por modelo, as durações informadas pelo Ollama no último objeto da resposta (em nanossegundos)
+    FIELDS = ("load_duration", "prompt_eval_duration", "eval_duration", "total_duration")
+
+    def __init__(self):
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def add(self, model_name, final):
+        with self._lock:
+            totals = self._totals.setdefault(model_name, dict.fromkeys(("requests",) + self.FIELDS, 0))
+            totals["requests"] += 1
+            for field in self.FIELDS:
+                totals[field] += final.get(field, 0)
+
+    def summary(self, model_name):
+        totals = self._totals.get(model_name)
+        if totals is None:
+            return f"{model_name}: nenhuma resposta concluída"
+        s = {field: totals[field] / 1e9 for field in self.FIELDS}
+        inference = s["prompt_eval_duration"] + s["eval_duration"]
+        return (f"{model_name}: {totals['requests']} requisição(ões), carregamento {s['load_duration']:.1f} s, "
+                f"inferência {inference:.1f} s (prompt {s['prompt_eval_duration']:.1f} s + geração {s['eval_duration']:.1f} s), "
+                f"total {s['total_duration']:.1f} s")
+
+    def report(self):
+        for model_name in self._totals:
+            print(f"[Info] {self.summary(model_name)}")
+
+class ModelPool:
+    # Executa tarefas com no máximo `concurrency` requisições simultâneas por modelo; modelos diferentes rodam em paralelo.
+    # Cada modelo aceita no máximo `window` tarefas aguardando ou em execução (padrão: 2 × concurrency, como no modo em
+    # lote do PaddleOCR): submit bloqueia até o modelo liberar espaço, limitando as tarefas e imagens em memória
+    def __init__(self, concurrency=1, window=None):
+        self.concurrency = max(1, concurrency)
+        self.window = max(1, window or 2 * self.concurrency)
+        self._executors = {}
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def submit(self, model_name, fn, *args):
+        with self._lock:
+            executor = self._executors.get(model_name)
+            if executor is None:
+                executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix=f"ollama-{model_name}")
+                self._executors[model_name] = executor
+                self._slots[model_name] = threading.BoundedSemaphore(self.window)
+            slots = self._slots[model_name]
+
+        slots.acquire()     # Bloqueia fora do lock: os outros modelos continuam recebendo tarefas
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future
+
+    def shutdown(self, wait=True):
+        for executor in self._executors.values():
+            executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
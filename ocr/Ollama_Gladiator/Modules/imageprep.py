@@ -0,0 +1,107 @@
+'''
+Informações: Módulo imageprep.py com a preparação das imagens enviadas aos modelos.
+Cada imagem é decodificada uma única vez, reduzida para o maior lado aceito por cada modelo e recodificada (JPEG ou WebP);
+o base64 resultante fica em cache e é reaproveitado por todos os modelos com o mesmo tamanho máximo.
+As coordenadas devolvidas pelos modelos se referem à imagem enviada; scale() informa o fator para voltar à imagem original.
+O Pillow é opcional: sem ele, o arquivo original é enviado sem alterações (como antes).
+'''
+
+import base64, io, threading
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:     # Sem Pillow: envia o arquivo original
+    Image = None
+
+DEFAULT_MAX_SIDE = 1536     # Maior lado enviado para modelos sem configuração própria
+IMAGE_FORMAT = "JPEG"       # Formato de recodificação: JPEG ou WEBP
+QUALITY = 90                # Qualidade da recodificação
+
+# Maior lado por modelo (prefixo do nome): acima disso o próprio modelo reduz a imagem, então os pixels extras só custam envio
+MODEL_MAX_SIDE = {
+    "llama3.2-vision": 1120,    # 4 blocos de 560 px
+    "gemma3": 896,              # Entrada fixa de 896 x 896
+    "ministral-3": 1540,
+    "qwen3-vl": 1536,
+}
+
+def max_side_for(model_name, override=None):
+    # Maior lado para o modelo: override (--max-side) > MODEL_MAX_SIDE > DEFAULT_MAX_SIDE. 0 desativa a redução
+    if override is not None:
+        return override
+    for prefix, side in MODEL_MAX_SIDE.items():
+        if model_name.startswith(prefix):
+            return side
+    return DEFAULT_MAX_SIDE
+
+class PreparedImage:
+    def __init__(self, image_path, uses=1, image_format=IMAGE_FORMAT, quality=QUALITY, sides=()):
+        self.path = image_path
+        self.image_format = image_format.upper()
+        self.quality = quality
+        self._uses = uses               # Modelos que ainda vão usar a imagem; no último release() o cache é liberado
+        self._image = None              # Imagem decodificada (com a orientação do EXIF aplicada)
+        self._rotated = False           # O EXIF pede rotação: o arquivo original não pode ser enviado como está
+        self._encoded = {}              # maior lado -> (base64, (fator x, fator y))
+        self._sides = set(sides)        # Tamanhos que serão pedidos: gerados juntos, na primeira chamada
+        self._original = None           # Base64 do arquivo original, compartilhado pelos tamanhos que não reduzem
+        self._lock = threading.Lock()   # Modelos diferentes podem pedir a mesma imagem ao mesmo tempo
+
+    def _decode(self):
+        if self._image is None:
+            with Image.open(self.path) as img:
+                upright = ImageOps.exif_transpose(img)  # Fotos de celular: coordenadas na orientação em que a imagem é exibida
+                upright.load()
+                self._rotated = upright.size != img.size or img.getexif().get(0x0112, 1) != 1  # Tag Orientation do EXIF
+            self._image = upright if upright.mode in ("RGB", "L") else upright.convert("RGB")
+        return self._image
+
+    def _original_base64(self):
+        if self._original is None:
+            with open(self.path, "rb") as f:
+                self._original = base64.b64encode(f.read()).decode("utf-8"), (1.0, 1.0)
+        return self._original
+
+    def _encode(self, max_side):
+        if Image is None:
+            return self._original_base64()
+
+        img = self._decode()
+        width, height = img.size
+        if (not max_side or max(width, height) <= max_side) and not self._rotated:
+            return self._original_base64()      # Já cabe no limite: envia o arquivo original, sem perda de qualidade
+
+        ratio = min(1.0, max_side / max(width, height)) if max_side else 1.0
+        size = (max(1, round(width * ratio)), max(1, round(height * ratio)))
+        resized = img.resize(size, Image.LANCZOS) if size != img.size else img
+
+        buffer = io.BytesIO()
+        resized.save(buffer, format=self.image_format, quality=self.quality)
+        scale = (size[0] / width, size[1] / height)
+        return base64.b64encode(buffer.getvalue()).decode("utf-8"), scale
+
+    def encode(self, max_side):
+        # Base64 da imagem com o maior lado limitado a max_side, calculado uma única vez por tamanho
+        with self._lock:
+            cached = self._encoded.get(max_side)
+            if cached is None:
+                for side in {max_side} | self._sides:
+                    if side not in self._encoded:
+                        self._encoded[side] = self._encode(side)
+                if self._sides:
+                    self._image = None      # Todos os tamanhos prontos: a imagem decodificada não é mais necessária
+                cached = self._encoded[max_side]
+            return cached
+
+    def scale(self, max_side):
+        # Fatores (x, y) entre a imagem enviada e a original
+        return self.encode(max_side)[1]
+
+    def release(self):
+        # Indica que um modelo terminou; quando todos terminarem, a imagem e os base64 saem da memória
+        with self._lock:
+            self._uses -= 1
+            if self._uses <= 0:
+                self._image = None
+                self._original = None
+                self._encoded.clear()
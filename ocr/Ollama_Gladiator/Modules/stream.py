@@ -0,0 +1,117 @@
+'''
+Informações: Módulo stream.py com a montagem das linhas do OCR a partir do streaming NDJSON do Ollama.
+Os fragmentos ("response") chegam picados em pedaços de poucos caracteres; em vez de concatenar tudo em uma única string
+(texto += ..., quadrático em respostas longas) e só separar as linhas no final, cada linha é entregue assim que termina,
+e o chamador já converte em token enquanto o modelo continua gerando.
+A resposta é interrompida antes do fim quando o modelo desanda:
+- passa do orçamento de tokens (também enviado ao Ollama como options.num_predict);
+- gera uma linha longa demais sem quebra;
+- gera muitas linhas seguidas fora do formato OCR='...';
+- repete a mesma linha várias vezes seguidas (loop de geração).
+'''
+
+from Modules.tokens import TOKEN_PATTERN
+
+MAX_TOKENS = 8192       # Orçamento de tokens gerados por resposta (0 = sem limite)
+MAX_LINE_CHARS = 512    # Uma linha válida tem o texto do token e poucos campos; acima disso a linha não termina mais
+MAX_BAD_LINES = 20      # Linhas seguidas fora do formato OCR='...'
+MAX_REPEATS = 10        # Mesma linha repetida seguida
+
+class LineAssembler:
+    # Junta os fragmentos em linhas completas, guardando apenas os pedaços da linha ainda incompleta
+    def __init__(self):
+        self._parts = []
+        self.pending = 0    # Caracteres da linha incompleta
+
+    def feed(self, fragment):
+        # Retorna as linhas completadas por este fragmento (sem a quebra de linha)
+        if "\n" not in fragment:
+            if fragment:
+                self._parts.append(fragment)
+                self.pending += len(fragment)
+            return []
+        pieces = fragment.split("\n")
+        self._parts.append(pieces[0])
+        lines = ["".join(self._parts)] + pieces[1:-1]
+        self._parts = [pieces[-1]] if pieces[-1] else []
+        self.pending = len(pieces[-1])
+        return [line.rstrip("\r") for line in lines]
+
+    def flush(self):
+        # Última linha, quando a resposta termina sem quebra de linha
+        line = "".join(self._parts).rstrip("\r")
+        self._parts = []
+        self.pending = 0
+        return [line] if line else []
+
+class OCRStream:
+    # Itera sobre as linhas completas de uma resposta do Ollama. Ao final, `final` tem o último objeto (done), com as
+    # durações e o eval_count, e `aborted` o motivo da interrupção (None se a resposta terminou normalmente)
+    def __init__(self, objects, max_tokens=MAX_TOKENS, max_line_chars=MAX_LINE_CHARS,
+                 max_bad_lines=MAX_BAD_LINES, max_repeats=MAX_REPEATS):
+        self.objects = objects
+        self.max_tokens = max_tokens
+        self.max_line_chars = max_line_chars
+        self.max_bad_lines = max_bad_lines
+        self.max_repeats = max_repeats
+        self.final = None
+        self.aborted = None
+        self.generated = 0      # Fragmentos recebidos: o Ollama envia um token por objeto
+
+    def _check_line(self, line, state):
+        # Atualiza os contadores com a linha e retorna o motivo para interromper, ou None
+        text = line.strip()
+        if not text:
+            return None
+        if TOKEN_PATTERN.search(text):
+            state["bad"] = 0
+        else:
+            state["bad"] += 1
+            if state["bad"] >= self.max_bad_lines:
+                return f"{state['bad']} linhas seguidas fora do formato OCR='...'"
+        state["repeats"] = state["repeats"] + 1 if text == state["last"] else 1
+        state["last"] = text
+        if state["repeats"] >= self.max_repeats:
+            return f"linha repetida {state['repeats']} vezes: {text[:60]}"
+        return None
+
+    def __iter__(self):
+        assembler = LineAssembler()
+        state = {"bad": 0, "repeats": 0, "last": None}
+        try:
+            for obj in self.objects:
+                fragment = obj.get("response", "")
+                if fragment:
+                    self.generated += 1
+                lines = assembler.feed(fragment)
+                if obj.get("done"):
+                    self.final = obj
+                    lines += assembler.flush()
+                    if obj.get("done_reason") == "length":
+                        self.aborted = f"orçamento de {self.max_tokens} tokens atingido"
+
+                for line in lines:
+                    reason = self._check_line(line, state)
+                    if reason:
+                        self.aborted = reason
+                        return
+                    yield line
+
+                if self.max_tokens and self.generated > self.max_tokens:
+                    self.aborted = f"orçamento de {self.max_tokens} tokens atingido"
+                    return
+                if assembler.pending > self.max_line_chars:
+                    self.aborted = f"linha com mais de {self.max_line_chars} caracteres sem quebra"
+                    return
+
+            for line in assembler.flush():      # Resposta encerrada sem o objeto final
+                reason = self._check_line(line, state)
+                if reason:
+                    self.aborted = reason
+                    return
+                yield line
+        finally:
+            # Fecha a resposta HTTP: ao perder a conexão, o Ollama para de gerar
+            close = getattr(self.objects, "close", None)
+            if close is not None:
+                close()
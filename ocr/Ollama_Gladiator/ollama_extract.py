@@ -1,8 +1,12 @@
-import base64, json, requests
+import argparse, time
 import os, sys 
 import Modules.path as path
-import Modules.config as config
-from Modules.json_processing import clear_data, to_json, save_json
+from Modules.client import OllamaClient, ModelPool, ModelStats, DEFAULT_URL, REQUEST_TIMEOUT, RETRIES
+from Modules.imageprep import PreparedImage, max_side_for, IMAGE_FORMAT, QUALITY
+from Modules.json_processing import ReceiptParser
+from Modules.stream import OCRStream, MAX_TOKENS
+from Modules.tokens import parse_token_line, write_ocr_txt
+from Modules.writer import get_writer, flush_writer
 
 # Modelos instalados via Ollama (pode ser instalado por meio do comando: ollama run <modelo>)
 MODELOS_INSTALADOS = [
@@ -17,14 +21,21 @@ MODELOS_INSTALADOS = [
     "qwen3-vl:8b",
 ]
 
-# Converte a imagem para base64 para ser processado pelos modelos LLM, onde não é possível enviar o arquivo diretamente para os modelos
-def image_to_base64(image_path):
-    with open(image_path, "rb") as f:
-        return base64.b64encode(f.read()).decode("utf-8")
+_client = None  # Cliente padrão (sessão com pool de conexões), criado sob demanda
 
-# Função para extrair o texto da imagem usando o modelo do Ollama 
-def extract_text_from_image(model_name, image_path):
-    img_b64 = image_to_base64(image_path)
+def get_client():
+    global _client
+    if _client is None:
+        _client = OllamaClient()
+    return _client
+
+# Função para extrair o texto da imagem usando o modelo do Ollama, linha a linha, à medida que o modelo gera (OCRStream)
+# image: PreparedImage já preparada (compartilhada entre os modelos); max_side: maior lado enviado (padrão: o do modelo)
+# keep_alive: tempo que o Ollama mantém o modelo carregado após a resposta; max_tokens: orçamento de tokens (0 = sem limite)
+def stream_text_from_image(model_name, image_path, client=None, image=None, max_side=None, keep_alive=None, max_tokens=MAX_TOKENS):
+    if image is None:
+        image = PreparedImage(image_path)
+    img_b64, _ = image.encode(max_side_for(model_name, max_side))   # Base64 calculado uma vez por imagem e tamanho
 
     prompt = """
 You are an OCR model.
@@ -70,33 +81,37 @@ Now process the uploaded image and return ONLY the OCR lines in this format.
         "prompt": prompt,
         "images": [img_b64]
     }
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
+    if max_tokens:
+        payload["options"] = {"num_predict": max_tokens}   # O próprio Ollama para de gerar no orçamento
 
-    # O modelo utiliza o Ollama pela API na porta 11434 para gerar todo o fluxo de OCR baseado no prompt
-    response = requests.post("http://localhost:11434/api/generate", json=payload, stream=True)
-
-    texto = ""
+    # O modelo utiliza o Ollama pela API (porta 11434 por padrão) para gerar todo o fluxo de OCR baseado no prompt
+    client = client or get_client()
 
     # Utiliza o formato NDJSON para o processamento em streaming
-    for line in response.iter_lines():
-        if not line:
-            continue
-        try:
-            obj = json.loads(line.decode("utf-8"))
-            # concatena o texto parcial
-            if "response" in obj:
-                texto += obj["response"]
-        except Exception as e:
-            print("[ERRO DECODIFICAÇÃO NDJSON]", e)
-            continue
-
-    # retorna texto final dividido em linhas
-    return texto.splitlines()
+    return OCRStream(client.generate(payload), max_tokens=max_tokens)
 
 def save_ocr_results(lines, output_path):
     with open(output_path, "w", encoding="utf-8") as f:
         for line in lines:
             f.write(line + "\n")
 
+def save_atomic(save_fn, data, output_path):
+    # Grava em um arquivo temporário e renomeia: o .txt só existe completo, e o --resume pode confiar nele
+    tmp_path = output_path + ".tmp"
+    save_fn(data, tmp_path)
+    os.replace(tmp_path, output_path)
+
+def ocr_txt_path(results_dir, image_file, model_name):
+    base_no_ext = os.path.splitext(os.path.basename(image_file))[0]
+    return os.path.join(results_dir, f"{base_no_ext}_{model_name}_ocr.txt")
+
+def pair_done(results_dir, image_file, model_name):
+    # O .txt é gravado por último (depois do JSON) e apenas quando a resposta terminou normalmente (sem ocr.aborted),
+    # então a existência dele indica que o par (imagem, modelo) terminou
+    return os.path.exists(ocr_txt_path(results_dir, image_file, model_name))
+
 def expand_input_paths(paths):
     # Recebe caminhos (arquivos ou diretórios) e retorna uma lista final apenas com arquivos de imagem válidos.    
     valid_ext = {".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".webp"}
@@ -121,56 +136,139 @@ def expand_input_paths(paths):
 
     return arquivos  # Retorna a lista final de arquivos a serem processados pelos modelos
 
+MODEL_MAJOR_KEEP_ALIVE = "10m"    # No model-major o modelo fica carregado durante o lote e é descarregado ao final
+
+# Processa um par (imagem, modelo): OCR pelo modelo, JSON e .txt
+def process_pair(client, image, model_name, results_dir, max_side=None, keep_alive=None, stats=None, max_tokens=MAX_TOKENS):
+    image_file = image.path
+    base_name = os.path.basename(image_file)
+    base_no_ext = os.path.splitext(base_name)[0]
+    start = time.time()
+    print(f"Processando {image_file} com {model_name}...")
+
+    try:                
+        # OCR                
+        side = max_side_for(model_name, max_side)
+        fx, fy = image.scale(side)
+        txt_path = ocr_txt_path(results_dir, image_file, model_name)
+        ocr = stream_text_from_image(model_name, image_file, client, image, side, keep_alive, max_tokens) # Processa baseado no modelo e string fornecida
+
+        # LINHAS → TOKENS → JSON à medida que as linhas chegam, com os bounding boxes convertidos para a imagem original
+        parser = ReceiptParser() # Parser próprio deste modelo/imagem, com os dados limpos
+        ocr_lines, tokens = [], []
+        for line in ocr:
+            ocr_lines.append(line)
+            token = parse_token_line(line)
+            if token is not None:
+                tokens.append(token.rescale(fx, fy))
+                parser.process_text(token.text)     # Classifica o texto do token enquanto o modelo continua gerando
+
+        if ocr.final is not None and stats is not None:
+            stats.add(model_name, ocr.final)        # Objeto final: durações de carregamento e inferência
+        if ocr.aborted:
+            # Resposta truncada ou descontrolada: nada é gravado, então o --resume refaz o par na próxima execução
+            print(f"[AVISO] Resposta interrompida ({base_name}, {model_name}): {ocr.aborted}; JSON e .txt não gravados")
+            return
+
+        if tokens:
+            parser.save_json(
+                filename=f"{base_no_ext}_{model_name}",
+                output_dir=results_dir
+            )
+        else:
+            print(f"[AVISO] Nenhum token válido encontrado ({base_name}, {model_name}).")
+
+        if (fx, fy) == (1.0, 1.0):
+            get_writer().submit(save_atomic, save_ocr_results, ocr_lines, txt_path)  # Salva a saída bruta do modelo no .txt em segundo plano
+        else:
+            get_writer().submit(save_atomic, write_ocr_txt, tokens, txt_path)        # Imagem reduzida: salva os tokens já nas coordenadas da original
+        print(f"OCR salvo em: {txt_path} ({model_name}, {time.time() - start:.1f} s)")
+
+    except Exception as e:
+        print(f"[ERRO] Falha com {model_name} ({base_name}): {e}")
+    finally:
+        image.release()     # O último modelo libera a imagem decodificada e os base64 da memória
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="OCR de imagens com os modelos multimodais instalados no Ollama.")
+    parser.add_argument("paths", nargs="+", help="imagens e/ou diretórios (busca recursiva)")
+    parser.add_argument("--url", default=DEFAULT_URL, help=f"endereço do Ollama (padrão: OLLAMA_HOST ou {DEFAULT_URL})")
+    parser.add_argument("--models", nargs="+", default=MODELOS_INSTALADOS, metavar="MODELO", help="modelos a usar (padrão: MODELOS_INSTALADOS)")
+    parser.add_argument("--concurrency", type=int, default=1, metavar="N", help="requisições simultâneas por modelo (padrão: 1)")
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT, metavar="S", help=f"prazo de cada requisição em segundos (padrão: {REQUEST_TIMEOUT})")
+    parser.add_argument("--retries", type=int, default=RETRIES, metavar="N", help=f"novas tentativas em falhas temporárias (padrão: {RETRIES})")
+    parser.add_argument("--max-side", type=int, default=None, metavar="PX", help="maior lado da imagem enviada para todos os modelos (padrão: por modelo; 0 envia o tamanho original)")
+    parser.add_argument("--image-format", choices=("jpeg", "webp"), default=IMAGE_FORMAT.lower(), help="formato das imagens reduzidas (padrão: jpeg)")
+    parser.add_argument("--quality", type=int, default=QUALITY, metavar="Q", help=f"qualidade das imagens reduzidas (padrão: {QUALITY})")
+    parser.add_argument("--order", choices=("image-major", "model-major"), default="image-major",
+                        help="image-major: todos os modelos em paralelo, imagem por imagem; model-major: todas as imagens com um modelo antes do próximo (padrão: image-major)")
+    parser.add_argument("--keep-alive", default=None, metavar="DURAÇÃO",
+                        help=f"tempo que o Ollama mantém o modelo carregado entre requisições, ex.: 10m (padrão: o do Ollama; {MODEL_MAJOR_KEEP_ALIVE} no model-major)")
+    parser.add_argument("--max-tokens", type=int, default=MAX_TOKENS, metavar="N",
+                        help=f"orçamento de tokens gerados por resposta; a resposta é interrompida ao atingi-lo (padrão: {MAX_TOKENS}; 0 = sem limite)")
+    parser.add_argument("--resume", action="store_true", help="pula os pares (imagem, modelo) cujo .txt já existe em results_OCR")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Uso: python3 ollama_extract.py <imagem1> ou <diretório> [...]")
-        sys.exit(1)
+    args = parse_args()
 
-    imagens = expand_input_paths(sys.argv[1:]) # Realiza o processamento das entradas
+    imagens = expand_input_paths(args.paths) # Realiza o processamento das entradas
+    if not imagens:
+        print("[ERRO] Nenhuma imagem encontrada.")
+        sys.exit(1)
 
     results_dir = path.results # Diretório onde vai ficar salvo os resultados 
 
-    for image_file in imagens: # Para cada imagem:
-
-        if not os.path.exists(image_file):
-            print(f"[ERRO] Arquivo não encontrado: {image_file}")
-            continue
-    
-        base_name = os.path.basename(image_file)
-        base_no_ext = os.path.splitext(base_name)[0]
-    
-        for model_name in MODELOS_INSTALADOS:
-            print(f"Processando {image_file} com {model_name}...")
-    
-            try:                
-                # OCR                
-                ocr_lines = extract_text_from_image(model_name, image_file) # Processa baseado no modelo e string fornecida
-    
-                ocr_txt_path = os.path.join(
-                    results_dir,
-                    f"{base_no_ext}_{model_name}_ocr.txt"
-                )
-    
-                save_ocr_results(ocr_lines, ocr_txt_path)   # Salva o resultado do OCR no formato .txt
-                print(f"OCR salvo em: {ocr_txt_path}")
-                    
-                # TXT → TOKENS                
-                tokens = config.parse_ocr_txt(ocr_txt_path) # Faz um parse para processar o arquivo em formato json posteriormente
-    
-                if not tokens:
-                    print("[AVISO] Nenhum token válido encontrado.")
-                    continue
-                    
-                # TOKENS → JSON                
-                clear_data() # Limpa dados anteriores antes de salvar um novo json
-    
-                palavras = [t["text"] for t in tokens] # Extrai apenas o texto dos tokens
-                to_json(palavras) # Converte para o formato json
-    
-                json_path = save_json(
-                    filename=f"{base_no_ext}_{model_name}",
-                    output_dir=results_dir
-                )
-    
+    # Pares (imagem, modelo) a processar; com --resume, os que já têm saída são pulados
+    pendentes = {image_file: [m for m in args.models if not (args.resume and pair_done(results_dir, image_file, m))]
+                 for image_file in imagens}
+    total = sum(len(models) for models in pendentes.values())
+    if args.resume:
+        print(f"[Info] --resume: {len(imagens) * len(args.models) - total} par(es) já processado(s), {total} pendente(s)")
+
+    keep_alive = args.keep_alive
+    if keep_alive is None and args.order == "model-major":
+        keep_alive = MODEL_MAJOR_KEEP_ALIVE
+
+    client = OllamaClient(args.url, timeout=args.timeout, retries=args.retries,
+                          pool_size=args.concurrency * len(args.models))
+    stats = ModelStats()
+    start = time.time()
+
+    if args.order == "model-major":
+        # Um modelo por vez: todas as imagens com o modelo carregado (keep_alive) e, ao final do lote, ele é
+        # descarregado para o próximo não disputar a memória. Evita que o Ollama troque de modelo a cada requisição
+        # Cada passada prepara as imagens só no tamanho do modelo atual e as libera ao final de cada par: entre os
+        # modelos nada fica em memória (uma imagem é decodificada uma vez por modelo, custo pequeno perto da inferência)
+        for model_name in args.models:
+            lote = [f for f, models in pendentes.items() if model_name in models]
+            if not lote:
+                continue
+            model_start = time.time()
+            with ModelPool(args.concurrency) as pool:
+                for image_file in lote:
+                    image = PreparedImage(image_file, image_format=args.image_format, quality=args.quality)
+                    pool.submit(model_name, process_pair, client, image, model_name, results_dir, args.max_side, keep_alive, stats, args.max_tokens)
+            try:
+                client.unload(model_name)
             except Exception as e:
-                print(f"[ERRO] Falha com {model_name}: {e}")    
\ No newline at end of file
+                print(f"[AVISO] Não foi possível descarregar {model_name}: {e}")
+            print(f"[Info] {stats.summary(model_name)}; lote em {time.time() - model_start:.1f} s")
+    else:
+        # Cada modelo tem a sua fila, com até --concurrency requisições simultâneas e no máximo 2 × --concurrency pares
+        # aguardando; os modelos rodam em paralelo, mas o mais rápido fica no máximo essa janela à frente do mais lento.
+        # A imagem é preparada uma única vez (decodificação, redução e base64) e compartilhada pelos modelos; todos os
+        # tamanhos necessários são gerados juntos, então a imagem decodificada não fica na memória até o último modelo
+        with ModelPool(args.concurrency) as pool:
+            for image_file, models in pendentes.items(): # Para cada imagem:
+                if not models:
+                    continue
+                image = PreparedImage(image_file, uses=len(models), image_format=args.image_format, quality=args.quality,
+                                      sides={max_side_for(m, args.max_side) for m in models})
+                for model_name in models:
+                    pool.submit(model_name, process_pair, client, image, model_name, results_dir, args.max_side, keep_alive, stats, args.max_tokens)
+
+    flush_writer()
+    client.close()
+    stats.report()
+    print(f"[Info] {total} par(es) (imagem, modelo) em {time.time() - start:.1f} s")
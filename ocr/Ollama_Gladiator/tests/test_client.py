@@ -0,0 +1,134 @@
+'''
+Informações: Testes do cliente do Ollama (Modules/client.py) contra um servidor local que imita o /api/generate em NDJSON.
+Executar a partir de ocr/Ollama_Gladiator:
+python -m unittest discover tests
+'''
+
+import json, os, sys, threading, time, unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Modules.client import OllamaClient, OllamaError, ModelPool
+
+class StubOllama:
+    # Servidor /api/generate: cada resposta leva `delay` segundos e devolve `fragments` em NDJSON, com o objeto final (done).
+    # Registra as requisições simultâneas por modelo; `fail_first` responde com esse status HTTP às primeiras requisições
+    def __init__(self, delay=0.2, fragments=("OCR='a', score=0.90\n", "OCR='b', score=0.80\n"), fail_first=()):
+        self.delay = delay
+        self.fragments = fragments
+        self.fail_first = list(fail_first)
+        self.requests = 0
+        self.active = {}            # modelo -> requisições em andamento
+        self.max_active = {}        # modelo -> maior número de requisições simultâneas
+        self.max_total = 0          # Maior número de requisições simultâneas somando os modelos
+        self.lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub.lock:
+                    stub.requests += 1
+                    status = stub.fail_first.pop(0) if stub.fail_first else 200
+                if status != 200:
+                    self.send_response(status)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                stub.generate(self, payload["model"])
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def generate(self, handler, model):
+        with self.lock:
+            self.active[model] = self.active.get(model, 0) + 1
+            self.max_active[model] = max(self.max_active.get(model, 0), self.active[model])
+            self.max_total = max(self.max_total, sum(self.active.values()))
+        try:
+            handler.send_response(200)
+            handler.send_header("Content-Type", "application/x-ndjson")
+            handler.end_headers()
+            time.sleep(self.delay)
+            for fragment in self.fragments:
+                handler.wfile.write((json.dumps({"model": model, "response": fragment, "done": False}) + "\n").encode())
+            final = {"model": model, "response": "", "done": True, "done_reason": "stop",
+                     "load_duration": 1_000_000, "eval_duration": 2_000_000, "total_duration": 3_000_000}
+            handler.wfile.write((json.dumps(final) + "\n").encode())
+        finally:
+            with self.lock:
+                self.active[model] -= 1
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+def run_generate(client, model):
+    return list(client.generate({"model": model, "prompt": "ocr", "images": []}))
+
+class OllamaClientTest(unittest.TestCase):
+    def test_generate_streams_ndjson(self):
+        with StubOllama(delay=0) as stub:
+            client = OllamaClient(stub.url, timeout=5)
+            objects = run_generate(client, "m1")
+            client.close()
+        self.assertEqual("".join(obj["response"] for obj in objects), "OCR='a', score=0.90\nOCR='b', score=0.80\n")
+        self.assertTrue(objects[-1]["done"])
+
+    def test_retries_temporary_failures(self):
+        with StubOllama(delay=0, fail_first=(503, 503)) as stub:
+            client = OllamaClient(stub.url, timeout=5, retries=2, backoff=0.01)
+            objects = run_generate(client, "m1")
+            client.close()
+        self.assertTrue(objects[-1]["done"])
+        self.assertEqual(stub.requests, 3)
+
+    def test_client_errors_are_not_retried(self):
+        with StubOllama(delay=0, fail_first=(404,)) as stub:
+            client = OllamaClient(stub.url, timeout=5, retries=3, backoff=0.01)
+            with self.assertRaises(OllamaError):
+                run_generate(client, "m1")
+            client.close()
+        self.assertEqual(stub.requests, 1)
+
+    def test_concurrency_per_model(self):
+        # Dois modelos com --concurrency 2: cada um com no máximo 2 requisições simultâneas, os dois ao mesmo tempo
+        with StubOllama(delay=0.2) as stub:
+            client = OllamaClient(stub.url, timeout=5, pool_size=4)
+            with ModelPool(concurrency=2) as pool:
+                futures = [pool.submit(model, run_generate, client, model) for _ in range(6) for model in ("m1", "m2")]
+            results = [f.result() for f in futures]
+            client.close()
+        self.assertTrue(all(r[-1]["done"] for r in results))
+        self.assertEqual(stub.max_active, {"m1": 2, "m2": 2})
+        self.assertEqual(stub.max_total, 4)
+
+    def test_window_bounds_pending_tasks(self):
+        # Com a janela cheia, submit bloqueia até uma tarefa do modelo terminar
+        release = threading.Event()
+        submitted = []
+        with ModelPool(concurrency=1, window=2) as pool:
+            def producer():
+                for i in range(5):
+                    pool.submit("m1", release.wait)
+                    submitted.append(i)
+            thread = threading.Thread(target=producer)
+            thread.start()
+            time.sleep(0.2)
+            self.assertEqual(len(submitted), 2)
+            release.set()
+            thread.join(5)
+        self.assertEqual(len(submitted), 5)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+'''
+Informações: Testes da montagem das linhas e da interrupção de respostas descontroladas (Modules/stream.py).
+Executar a partir de ocr/Ollama_Gladiator:
+python -m unittest discover tests
+'''
+
+import os, sys, unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Modules.stream import LineAssembler, OCRStream
+
+def fragments(*texts, done=True):
+    # Objetos NDJSON como o Ollama envia, com o objeto final (done) opcional
+    objects = [{"response": text, "done": False} for text in texts]
+    if done:
+        objects.append({"response": "", "done": True, "done_reason": "stop"})
+    return objects
+
+class LineAssemblerTest(unittest.TestCase):
+    def test_lines_split_across_fragments(self):
+        assembler = LineAssembler()
+        self.assertEqual(assembler.feed("OCR='a"), [])
+        self.assertEqual(assembler.feed("', score=0.9\nOCR="), ["OCR='a', score=0.9"])
+        self.assertEqual(assembler.pending, 4)
+        self.assertEqual(assembler.flush(), ["OCR="])
+
+class OCRStreamTest(unittest.TestCase):
+    def test_yields_lines_until_done(self):
+        stream = OCRStream(fragments("OCR='a', sco", "re=0.9\nOCR='b', score=0.8"))
+        self.assertEqual(list(stream), ["OCR='a', score=0.9", "OCR='b', score=0.8"])
+        self.assertIsNone(stream.aborted)
+        self.assertTrue(stream.final["done"])
+
+    def test_aborts_on_repeated_lines(self):
+        stream = OCRStream(fragments(*["OCR='a', score=0.9\n"] * 5), max_repeats=3)
+        self.assertEqual(len(list(stream)), 2)
+        self.assertTrue(stream.aborted.startswith("linha repetida 3 vezes"))
+
+    def test_flush_without_done_checks_lines(self):
+        # Sem o objeto final, a última linha passa pelas mesmas verificações e interrompe a resposta do mesmo jeito
+        stream = OCRStream(fragments("lixo\nlixo\n", "lixo", done=False), max_bad_lines=3)
+        self.assertEqual(list(stream), ["lixo", "lixo"])
+        self.assertEqual(stream.aborted, "3 linhas seguidas fora do formato OCR='...'")
+        self.assertIsNone(stream.final)
+
+    def test_flush_without_done_keeps_valid_line(self):
+        stream = OCRStream(fragments("OCR='a', score=0.9\n", "OCR='b', score=0.8", done=False))
+        self.assertEqual(list(stream), ["OCR='a', score=0.9", "OCR='b', score=0.8"])
+        self.assertIsNone(stream.aborted)
+
+    def test_closes_response(self):
+        class Response(list):
+            closed = False
+            def close(self):
+                self.closed = True
+        response = Response(fragments(*["OCR='a', score=0.9\n"] * 5))
+        list(OCRStream(response, max_repeats=2))
+        self.assertTrue(response.closed)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,31 +1,44 @@
-import os, cv2, time
+import os, cv2, time, threading
 import numpy as np
 import matplotlib.pyplot as plt
 from PIL import Image, ImageDraw
-from multiprocessing import Pool, cpu_count
+from multiprocessing import Pool, cpu_count, util
 
 # Importação dos módulos path, config, módulos das funções de JSON e corretor ortográfico
 import Modules.path as path
 import Modules.config as config
-from Modules.json_processing import clear_data, to_json, create_json, save_json
+from Modules.json_processing import ReceiptParser
+import Modules.spellchecker as spellchecker
 from Modules.spellchecker import to_spellchecker as correct_word
-from Modules.config import parse_ocr_txt, reorder_tokens 
+from Modules.spellcache import cache_stats
+from Modules.config import reorder_tokens 
+from Modules.tokens import OCRToken, write_ocr_txt
+from Modules.writer import get_writer, flush_writer
 
 its_console = False    # Variável para detectar se a entrada é via console ou EasyGUI
 spellcorrector = True  # Variável para ativaar/desativar o corrector ortográfico pelo terminal através do argumento --nsc       
 jsonoutput = True      # Variável para ativar/desativar a saída em JSON                                                     
+txtoutput = True       # Variável para ativar/desativar a saída em .txt (gravada em segundo plano)
+workers = 1            # Número de processos do modo em lote, definido pelo argumento --workers N
+render = "full"        # Plotagem: "none" (nenhuma), "lazy" (apenas quando exibida no EasyGUI) ou "full" (sempre grava a imagem plotada)
+pipeline = "full"      # "full": detector PP-OCRv3 completo + reconhecimento PP-OCRv4; "det": apenas a detecção do PP-OCRv3 + PP-OCRv4
+speller = "consensus"  # Motor do corretor: "consensus" (pyspellchecker + autocorrect) ou "symspell" (índice de deleções), pelo argumento --speller
 
 # Função para carregar todas as imagens de um diretório pelo EasyGUI
 def load_image(img_paths):
     start_time = time.time()
 
     print(f"[Info] Processando {len(img_paths)} imagem(ns)")
+    spellchecker.speller = speller
 
-#    with Pool(cpu_count()) as pool:
-#        pool.map(process_image, img_paths)
-   
-    for img_path in img_paths:
-        process_image(img_path)
+    if workers > 1 and len(img_paths) > 1:  # Modo em lote: um Pool de processos, cada um com seus próprios modelos
+        process_batch(img_paths)
+    else:
+        config.init_models()                # Modo sequencial: os modelos são carregados uma vez no processo atual
+        for img_path in img_paths:
+            process_image(img_path)
+        flush_writer()                      # Aguarda as imagens plotadas ainda em gravação
+        print_cache_stats()
 
     end_time = time.time()
 
@@ -36,6 +49,77 @@ def load_image(img_paths):
     else:
         print(f"[Info] Tempo total: {elapsed:.2f} segundos")
 
+# Inicializador de cada worker do Pool: replica as opções do processo principal e carrega os modelos uma única vez
+def init_worker(options, cpu_threads):
+    global its_console, spellcorrector, jsonoutput, txtoutput, render, pipeline, speller
+    its_console, spellcorrector, jsonoutput, txtoutput, render, pipeline, speller = options
+    spellchecker.speller = speller
+    config.init_models(cpu_threads=cpu_threads)
+    util.Finalize(None, print_cache_stats, exitpriority=20)    # Cada worker informa o seu cache ao encerrar
+
+# Exibe os acertos/falhas do cache ortográfico do processo atual, se o corretor foi usado
+def print_cache_stats():
+    stats = cache_stats()
+    if stats:
+        print(stats)
+
+# Função para processar as imagens em paralelo com número limitado de imagens em voo
+def process_batch(img_paths):
+    n_workers = min(workers, len(img_paths))
+    cpu_threads = max(1, cpu_count() // n_workers)     # Divide os núcleos entre os workers para o Paddle não disputar CPU
+    in_flight = threading.BoundedSemaphore(2 * n_workers) # No máximo duas imagens por worker aguardando ou em processamento
+
+    def done(_):
+        in_flight.release()
+
+    def failed(e):
+        print(f"[Erro] Falha ao processar imagem: {e}")
+        in_flight.release()
+
+    # Os workers nunca exibem a plotagem (its_console=True), pois não há janela nos processos filhos
+    options = (True, spellcorrector, jsonoutput, txtoutput, render, pipeline, speller)
+    print(f"[Info] Modo em lote com {n_workers} workers ({cpu_threads} threads cada)")
+
+    with Pool(n_workers, initializer=init_worker, initargs=(options, cpu_threads)) as pool:
+        for img_path in img_paths:
+            in_flight.acquire()     # Bloqueia até algum worker liberar espaço
+            pool.apply_async(process_image, (img_path,), callback=done, error_callback=failed)
+        pool.close()
+        pool.join()
+
+# Função para reconhecer todos os recortes detectados em lotes, devolvendo (box, (texto, score)) na ordem das caixas
+def recognize_crops(img_rgb, boxes):
+    crops = []  # Pares (índice da caixa, recorte)
+
+    for i, box in enumerate(boxes):
+        pts = np.array(box).astype(int)
+
+        x0 = max(min(pts[:, 0]), 0)
+        y0 = max(min(pts[:, 1]), 0)
+        x1 = max(pts[:, 0])
+        y1 = max(pts[:, 1])
+
+        crop = img_rgb[y0:y1, x0:x1]  # recorta a região do texto
+        if crop.size == 0:            # Caixas degeneradas (sem área) não têm o que reconhecer
+            continue
+        crops.append((i, crop))
+
+    # O reconhecedor normaliza a altura e completa a largura até a maior proporção do lote,
+    # então lotes com recortes de proporção parecida desperdiçam menos processamento com preenchimento
+    crops.sort(key=lambda c: c[1].shape[1] / c[1].shape[0])
+
+    recognized = {}
+    for start in range(0, len(crops), config.REC_BATCH_SIZE):
+        batch = crops[start:start + config.REC_BATCH_SIZE]
+
+        # Uma única chamada de classificação de ângulo + reconhecimento para todo o lote
+        rec_res = config.ocr_recognizer.ocr([crop for _, crop in batch], det=False, rec=True, cls=True)[0]
+
+        for (i, _), res in zip(batch, rec_res or []):
+            recognized[i] = res
+
+    return [(boxes[i], recognized[i]) for i in sorted(recognized)]  # Volta para a ordem original das caixas
+
 # Função para processar a imagem e aplicar OCR
 def process_image(img_path):    
     start = time.time()
@@ -43,45 +127,31 @@ def process_image(img_path):
     img_name = os.path.basename(img_path)         # Nome base do arquivo a ser feito o processamento de imagem
     name_no_ext = os.path.splitext(img_name)[0]   # Remove a extensão do nome do arquivo para uso posterior 
 
-    # === Lê a imagem com OpenCV e converte para PIL ===
+    # === Lê a imagem com OpenCV e converte para RGB ===
     img_cv = cv2.imread(img_path)
+    if img_cv is None:
+        print(f"[Aviso] Não foi possível ler a imagem: {img_path}")
+        return
     img_rgb = cv2.cvtColor(img_cv, cv2.COLOR_BGR2RGB)
-    img_pil = Image.fromarray(img_rgb)
-    draw = ImageDraw.Draw(img_pil)
 
     # === OCR utilizando as configurações do modulo config ===
-    det_output = config.ocr_detector.ocr(img_path, cls=True)   # Detecção de texto pelo módulo de detecção na config.py
+    # A imagem já decodificada (BGR) é reaproveitada, evitando que o Paddle leia img_path do disco novamente
+    if pipeline == "det":
+        det_output = config.ocr_detector.ocr(img_cv, det=True, rec=False, cls=False)    # Apenas as caixas; o texto vem só do ocr_recognizer
+    else:
+        det_output = config.ocr_detector.ocr(img_cv, cls=True)   # Detecção de texto pelo módulo de detecção na config.py (texto PP-OCRv3 descartado)
 
     if not det_output or det_output[0] is None:
         print(f"[Aviso] Nenhuma detecção em: {img_path}")
         return
 
     det_res = det_output[0]
-    result = []
-
-    # Limpeza do JSON anterior
-    if jsonoutput == True:
-        clear_data()
-
-    for box, _ in det_res:
-        pts = np.array(box).astype(int)
-        
-        x0 = max(min(pts[:, 0]), 0)
-        y0 = max(min(pts[:, 1]), 0)
-        x1 = max(pts[:, 0])
-        y1 = max(pts[:, 1])
+    boxes = det_res if pipeline == "det" else [box for box, _ in det_res]   # No modo "det" a saída já é a lista de caixas
 
-        crop = img_rgb[y0:y1, x0:x1]  # recorta a região do texto
-        crop_pil = Image.fromarray(crop)
+    result = recognize_crops(img_rgb, boxes)  # Reconhece todos os recortes em lotes
 
-        # Agora reconhece só esse crop
-        rec_res = config.ocr_recognizer.ocr(np.array(crop_pil), det=False, rec=True, cls=True)[0]
-
-        if rec_res:
-            result.append((box, rec_res[0]))  # mantém compatível com o loop original
-
-    # === Processa OCR e desenha ===
-    raw_text = ""
+    # === Processa OCR ===
+    tokens = []  # OCRToken de cada texto reconhecido, usados no JSON, no .txt e na plotagem
 
     # Itera sobre os resultados do OCR
     for box, (text, score) in result:
@@ -93,9 +163,6 @@ def process_image(img_path):
         x1 = max(pts[0][0], pts[2][0])
         y1 = max(pts[0][1], pts[2][1])
 
-        top_left = (x0, y0)                     # Topo superior esquerdo da caixa delimitadora
-        bottom_right = (x1, y1)                 # Canto inferior direito da caixa delimitadora
-
         # CORRETOR ORTOGRAFICO VAI AQUI
         if spellcorrector == True:
             text, score = correct_word(text, score)               # Corrige a palavra utilizando o corretor ortográfico
@@ -104,7 +171,78 @@ def process_image(img_path):
         #if jsonoutput == True:  
         #    to_json(text)                           # Processa o texto para identificar CPFs, CNPJs, datas, etc.           
 
-        color = config.get_color(score)         # Desenha a caixa delimitadora do texto baseada no score do PaddleOCR
+        # O token guarda o texto identificado, o score baseado na confiança do Paddle e as coordenadas do bounding box
+        tokens.append(OCRToken(text, score, x0, y0, x1, y1))
+
+    # Construção do JSON                                              
+    if jsonoutput == True:
+        if spellcorrector == True:
+            txt_filename = os.path.join(path.results, f"{name_no_ext}_Paddle_ocr_SpellCorrected.txt")
+            plot_filename = os.path.join(path.results, f"{name_no_ext}_Paddle_plotagem_SpellCorrected.png")
+            name = f"{name_no_ext}_PaddleOCR_JsonProcessing_SpellCorrected"
+           # save_json(filename=f"{name_no_ext}_JsonProcessing_SpellCorrected", output_dir=path.results) # Salva o JSON no diretório de resultados com correção ortográfica
+        else:        
+            txt_filename = os.path.join(path.results, f"{name_no_ext}_Paddle_ocr_NoSpellCorrected.txt")
+            plot_filename = os.path.join(path.results, f"{name_no_ext}_Paddle_plotagem_NoSpellCorrected.png")
+            name = f"{name_no_ext}_PaddleOCR_JsonProcessing_NoSpellCorrected"
+           # save_json(filename=f"{name_no_ext}_JsonProcessing_NoSpellCorrected", output_dir=path.results)  # Salva o JSON no diretório de resultados sem correção ortográfica
+    else:
+        if spellcorrector == True:
+            txt_filename = os.path.join(path.results, f"{name_no_ext}_Paddle_ocr_SpellCorrected.txt")
+            plot_filename = os.path.join(path.results, f"{name_no_ext}_Paddle_plotagem_SpellCorrected.png")
+            print("[Info] O módulo de json foi desabilitado")
+        else:        
+            txt_filename = os.path.join(path.results, f"{name_no_ext}_Paddle_ocr_NoSpellCorrected.txt")
+            plot_filename = os.path.join(path.results, f"{name_no_ext}_Paddle_plotagem_NoSpellCorrected.png")
+            print("[Info] O módulo de json foi desabilitado")
+
+    # === Salva os resultados em txt (em segundo plano, não é mais lido de volta) ===
+    if txtoutput == True:
+        get_writer().submit(write_ocr_txt, tokens, txt_filename)
+        print(f"txt gravado, local: file://{os.path.abspath(txt_filename)}")
+
+    # Os tokens seguem em memória direto para a ordenação em linhas e o processamento JSON
+    if jsonoutput == True:
+        linhas = reorder_tokens(tokens)
+        
+        # Agora enviamos na ORDEM CORRETA para o processamento JSON, com um parser próprio desta imagem
+        parser = ReceiptParser()
+        parser.parse([t.text.strip() for t in linha] for linha in linhas)
+        parser.save_json(filename=name, output_dir=path.results)
+
+    # === Plotagem (imagem com as caixas e textos) ===
+    # none: nenhuma plotagem; lazy: plota só quando a imagem será exibida (EasyGUI); full: sempre grava a imagem plotada
+    show = its_console == False and render != "none"   # A figura do Matplotlib só é construída quando for exibida
+
+    if show:
+        img_pil = draw_overlay(img_rgb, tokens)         # Renderiza agora, pois a imagem será exibida em seguida
+        get_writer().submit(save_plot, img_pil, plot_filename)
+        plt.figure(figsize=(12, 16))                    # Tamanho maior para melhor visualização  
+        plt.imshow(img_pil)                             # A imagem do PIL já está em RGB, formato esperado pelo Matplotlib
+        plt.axis("off")                                 # Desativa os eixos para uma visualização mais limpa
+        plt.title(f"OCR: {img_name}")                   # Titulo da imagem com o nome do arquivo 
+        plt.subplots_adjust(left=0, right=1, top=1, bottom=0)   # Preenche toda a figura
+        plt.show()
+    elif render == "full":                              # Renderização e gravação do PNG ficam na thread de escrita
+        get_writer().submit(render_plot, img_rgb, tokens, plot_filename)
+
+    if show or render == "full":
+        print(f"Paddle Identificou: file://{os.path.abspath(plot_filename)}") # Exibe o caminho da imagem plotada pelo PaddleOCR        
+    end = time.time()
+    print(f"[Info] {os.path.basename(img_path)} processada em {end - start:.2f} s")
+
+# Função para desenhar as caixas, os textos reconhecidos e a legenda sobre uma cópia da imagem
+def draw_overlay(img_rgb, tokens):
+    img_pil = Image.fromarray(img_rgb)
+    draw = ImageDraw.Draw(img_pil)
+    font = config.font                              # Fonte da legenda caso não haja nenhum token
+
+    for token in tokens:
+        text = token.text
+        top_left = (token.x, token.y)           # Topo superior esquerdo da caixa delimitadora
+        bottom_right = (token.x2, token.y2)     # Canto inferior direito da caixa delimitadora
+
+        color = config.get_color(token.score)        # Desenha a caixa delimitadora do texto baseada no score do PaddleOCR
 
         draw.rectangle([top_left, bottom_right], outline=color, width=3) # Desenha a caixa delimitadora do texto para evitar sobreposiçaõ
 
@@ -136,32 +274,6 @@ def process_image(img_path):
         # Texto principal branco 
         draw.text((text_x, text_y), text, font=font, fill=(255, 255, 255))
 
-        # A saída do OCR é formatada para incluir o texto identificado, o score baseado na confiança do Paddle e as coordenadas do bounding box
-        raw_text += f"OCR='{text}', score={score:.2f}, bbox=[{x0},{y0},{x1},{y1}]\n"
-
-    # Construção do JSON                                              
-    if jsonoutput == True:
-        create_json()   # Primeiro cria o JSON
-        if spellcorrector == True:
-            txt_filename = os.path.join(path.results, f"{name_no_ext}_Paddle_ocr_SpellCorrected.txt")
-            plot_filename = os.path.join(path.results, f"{name_no_ext}_Paddle_plotagem_SpellCorrected.png")
-            name = f"{name_no_ext}_PaddleOCR_JsonProcessing_SpellCorrected"
-           # save_json(filename=f"{name_no_ext}_JsonProcessing_SpellCorrected", output_dir=path.results) # Salva o JSON no diretório de resultados com correção ortográfica
-        else:        
-            txt_filename = os.path.join(path.results, f"{name_no_ext}_Paddle_ocr_NoSpellCorrected.txt")
-            plot_filename = os.path.join(path.results, f"{name_no_ext}_Paddle_plotagem_NoSpellCorrected.png")
-            name = f"{name_no_ext}_PaddleOCR_JsonProcessing_NoSpellCorrected"
-           # save_json(filename=f"{name_no_ext}_JsonProcessing_NoSpellCorrected", output_dir=path.results)  # Salva o JSON no diretório de resultados sem correção ortográfica
-    else:
-        if spellcorrector == True:
-            txt_filename = os.path.join(path.results, f"{name_no_ext}_Paddle_ocr_SpellCorrected.txt")
-            plot_filename = os.path.join(path.results, f"{name_no_ext}_Paddle_plotagem_SpellCorrected.png")
-            print("[Info] O módulo de json foi desabilitado")
-        else:        
-            txt_filename = os.path.join(path.results, f"{name_no_ext}_Paddle_ocr_NoSpellCorrected.txt")
-            plot_filename = os.path.join(path.results, f"{name_no_ext}_Paddle_plotagem_NoSpellCorrected.png")
-            print("[Info] O módulo de json foi desabilitado")
-
     # === Legenda na imagem ===
     caption_texts = [
         ("Verde: Texto CORRETO (match com esperado)", (0, 255, 0)),
@@ -175,37 +287,11 @@ def process_image(img_path):
     for i, (caption, color) in enumerate(caption_texts):
         draw.text((lx, ly + i * 30), caption, fill=color, font=font)
 
-    # === Salva os resultados em txt e imagem plotada ===
-    with open(txt_filename, "w", encoding="utf-8") as f:
-        f.write(raw_text)    
-        print(f"txt gravado, local: file://{os.path.abspath(txt_filename)}")
-    img_pil.save(plot_filename)    
-        
-    # # EM TESTES: Depois de salvar o txt:
-    if jsonoutput == True:
-        tokens = parse_ocr_txt(txt_filename)
-        linhas = reorder_tokens(tokens)
-        
-        # Agora enviamos na ORDEM CORRETA para o processamento JSON
-        if jsonoutput:
-            clear_data()  # Garantir JSON limpo
-            for linha in linhas:
-                palavras_linha = [t["text"] for t in linha]
-                to_json(palavras_linha)  # Agora processa em lote corretamente
-            create_json()
-            save_json(filename=name, output_dir=path.results)
-
-
-    # === Exibe com Matplotlib ===
-    img_with_plot = cv2.cvtColor(np.array(img_pil), cv2.COLOR_RGB2BGR)  #Converte de RGB para BGR para compatibilidade com OpenCV
-    plt.figure(figsize=(12, 16))                                        # Tamanho maior para melhor visualização  
-    plt.imshow(cv2.cvtColor(img_with_plot, cv2.COLOR_BGR2RGB))          # Converte de BGR para RGB para garantir a exibição das cores do Matplotlib
-    plt.axis("off")                                                     # Desativa os eixos para uma visualização mais limpa
-    plt.title(f"OCR: {img_name}")                                       # Titulo da imagem com o nome do arquivo 
-    plt.subplots_adjust(left=0, right=1, top=1, bottom=0)               # Preenche toda a figura
-    
-    if its_console == False:  # Se não for via console, exibe a imagem plotada
-        plt.show()            # Opção para exibir a imagem plotada após o processamento, desativado para ser mais rapido            
-    print(f"Paddle Identificou: file://{os.path.abspath(plot_filename)}") # Exibe o caminho da imagem plotada pelo PaddleOCR        
-    end = time.time()
-    print(f"[Info] {os.path.basename(img_path)} processada em {end - start:.2f} s")
+    return img_pil
+
+# Tarefas executadas pela thread de escrita
+def save_plot(img_pil, plot_filename):
+    img_pil.save(plot_filename)
+
+def render_plot(img_rgb, tokens, plot_filename):
+    save_plot(draw_overlay(img_rgb, tokens), plot_filename)
@@ -13,10 +13,15 @@ results = BASE_DIR / "results_OCR"
 # Caminho para as imagens a serem carregadas, caso não seja especificado como argumento 
 load_images = BASE_DIR / "images"
 
+# Caminho do cache persistente do corretor ortográfico (compartilhado entre execuções e workers)
+cache = BASE_DIR / "cache"
+
 # Cria os diretórios se não existirem
 results.mkdir(parents=True, exist_ok=True)
 load_images.mkdir(parents=True, exist_ok=True)
+cache.mkdir(parents=True, exist_ok=True)
 
 # Converter para string para garantir a compatibilidade com outros módulos do projeto
 results = str(results)
-load_images = str(load_images)
\ No newline at end of file
+load_images = str(load_images)
+cache = str(cache)
\ No newline at end of file
@@ -0,0 +1,155 @@
+'''
+Informações: Módulo spellcache.py com o cache das correções ortográficas.
+Nomes de produtos como "FILE COXAS SEARA" se repetem em quase todos os cupons, e cada correção passa por uma busca por
+distância de edição (pyspellchecker) e pelo autocorrect. O cache guarda o resultado por palavra em dois níveis:
+- memória: LRU limitado a MEMORY_SIZE palavras, no processo atual;
+- disco: banco sqlite em path.cache, que sobrevive entre execuções e é compartilhado pelos workers do modo em lote.
+'''
+
+import atexit, os, sqlite3, threading, time, unicodedata
+from collections import OrderedDict
+from multiprocessing import util
+
+import Modules.path as path
+
+CACHE_VERSION = 1       # Incrementar quando a lógica de correção mudar, invalidando as correções já gravadas
+MEMORY_SIZE = 4096      # Máximo de palavras no LRU em memória
+DISK_SIZE = 200_000     # Máximo de palavras no sqlite; as menos usadas são removidas ao fechar
+FLUSH_EVERY = 64        # Correções novas acumuladas antes de gravar no disco
+
+def normalize(word):
+    # Chave do cache: a mesma palavra vinda do OCR com composição Unicode diferente (NFC/NFD) ou espaços nas bordas
+    # cai na mesma entrada. A caixa é mantida, pois o autocorrect preserva maiúsculas/minúsculas no resultado
+    return unicodedata.normalize("NFC", word).strip()
+
+class SpellCache:
+    def __init__(self, db_path, memory_size=MEMORY_SIZE, disk_size=DISK_SIZE):
+        self.db_path = db_path
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.hits = 0           # Encontradas na memória
+        self.disk_hits = 0      # Encontradas no sqlite (gravadas por outra execução ou outro worker)
+        self.misses = 0         # Corrigidas pelos corretores
+        self._memory = OrderedDict()
+        self._pending = {}      # Correções novas ainda não gravadas: palavra -> correção
+        self._used = set()      # Palavras do disco usadas nesta execução, para atualizar o LRU do sqlite
+        self._lock = threading.Lock()
+        self._conn = None
+        self._closed = False
+
+    def _connect(self):
+        # Conexão aberta sob demanda: com --nospell o banco nunca é criado
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")      # Leitores não bloqueiam o worker que estiver gravando
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS spell ("
+                "word TEXT PRIMARY KEY, corrected TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+        return self._conn
+
+    def get(self, word):
+        # Retorna a correção em cache ou None
+        with self._lock:
+            corrected = self._memory.get(word)
+            if corrected is not None:
+                self._memory.move_to_end(word)
+                self.hits += 1
+                return corrected
+
+            corrected = self._pending.get(word)   # Já corrigida nesta execução, mas descartada do LRU antes de ir para o disco
+            if corrected is not None:
+                self._remember(word, corrected)
+                self.hits += 1
+                return corrected
+
+            row = self._connect().execute("SELECT corrected FROM spell WHERE word = ?", (word,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._used.add(word)
+            self._remember(word, row[0])
+            return row[0]
+
+    def put(self, word, corrected):
+        with self._lock:
+            self._remember(word, corrected)
+            self._pending[word] = corrected
+            if len(self._pending) >= FLUSH_EVERY:
+                self._flush()
+
+    def _remember(self, word, corrected):
+        self._memory[word] = corrected
+        self._memory.move_to_end(word)
+        if len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)    # Descarta a palavra usada há mais tempo
+
+    def _flush(self):
+        if not self._pending and not self._used:
+            return
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:      # Uma única transação por lote de correções
+                conn.executemany(
+                    "INSERT OR REPLACE INTO spell (word, corrected, last_used) VALUES (?, ?, ?)",
+                    [(word, corrected, now) for word, corrected in self._pending.items()],
+                )
+                conn.executemany("UPDATE spell SET last_used = ? WHERE word = ?", [(now, word) for word in self._used])
+        except sqlite3.OperationalError as e:   # Banco ocupado por muito tempo: as correções continuam valendo em memória
+            print(f"[Aviso] Não foi possível gravar o cache ortográfico: {e}")
+            return
+        self._pending.clear()
+        self._used.clear()
+
+    def flush(self):
+        # Grava as correções pendentes no disco
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        # Grava as pendências e limita o tamanho do banco (pode ser chamada mais de uma vez)
+        with self._lock:
+            if self._closed or self._conn is None:
+                self._closed = True
+                return
+            self._closed = True
+            self._flush()
+            try:
+                with self._conn:
+                    self._conn.execute(
+                        "DELETE FROM spell WHERE word IN "
+                        "(SELECT word FROM spell ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                        (self.disk_size,),
+                    )
+            except sqlite3.OperationalError:
+                pass        # Outro processo está gravando; a limpeza fica para o próximo fechamento
+            self._conn.close()
+            self._conn = None
+
+    def stats(self):
+        total = self.hits + self.disk_hits + self.misses
+        rate = (self.hits + self.disk_hits) / total * 100 if total else 0.0
+        return (f"[Info] Cache ortográfico: {self.hits} acertos em memória, {self.disk_hits} no disco, "
+                f"{self.misses} falhas ({rate:.1f}% de acerto)")
+
+_caches = {}    # Caches do processo atual por motor de correção, criados sob demanda
+
+def get_cache(engine="consensus"):
+    # Cada motor tem o seu banco: as correções do consenso e do SymSpell não se misturam
+    cache = _caches.get(engine)
+    if cache is None:
+        name = "spellcheck" if engine == "consensus" else f"spellcheck_{engine}"
+        cache = SpellCache(os.path.join(path.cache, f"{name}_v{CACHE_VERSION}.sqlite"))
+        atexit.register(cache.close)                                # Processo principal
+        util.Finalize(None, cache.close, exitpriority=10)           # Workers do Pool não executam atexit
+        _caches[engine] = cache
+    return cache
+
+def cache_stats():
+    # Estatísticas do processo atual, ou None se o cache não foi usado
+    if not _caches:
+        return None
+    return "\n".join(cache.stats() for cache in _caches.values())
@@ -2,6 +2,9 @@ from spellchecker import SpellChecker
 from autocorrect import Speller
 import re
 from collections import Counter
+from Modules.spellcache import get_cache, normalize
+from Modules.symspell import load_index
+import Modules.path as path
 
 # Dicionário personalizado com mapeamento de palavras específicas (separadas)
 CUSTOM_DICTIONARY = {
@@ -86,6 +89,38 @@ CUSTOM_DICTIONARY = {
 spell_checker = SpellChecker(language='pt')
 autocorrect_speller = Speller(lang='pt')
 
+speller = "consensus"   # Motor de correção: "consensus" (pyspellchecker + autocorrect, com cache) ou "symspell" (índice de deleções)
+_symspell = None        # Índice SymSpell do processo atual, aberto sob demanda
+
+def symspell_frequencies():
+    # Dicionário de frequências do pyspellchecker (PT) mais as palavras das correções do dicionário personalizado,
+    # que recebem a maior frequência para vencer os empates
+    frequencies = dict(spell_checker.word_frequency.dictionary)
+    top = max(frequencies.values(), default=1)
+    for correction in CUSTOM_DICTIONARY.values():
+        for custom_word in correction.lower().split():
+            frequencies[custom_word] = top
+    return frequencies
+
+def get_symspell():
+    global _symspell
+    if _symspell is None:
+        # A assinatura muda quando o dicionário personalizado ou o do pyspellchecker mudam, gerando um índice novo
+        signature = f"{len(spell_checker.word_frequency.dictionary)}|" + "|".join(sorted(CUSTOM_DICTIONARY.values()))
+        _symspell = load_index(symspell_frequencies, path.cache, signature)
+    return _symspell
+
+def symspell_correction(word):
+    # Correção pelo índice SymSpell, mantendo a caixa da palavra original (MAIÚSCULAS ou Título)
+    corrected = get_symspell().correction(word)
+    if corrected is None:
+        return word
+    if word.isupper():
+        return corrected.upper()
+    if word.istitle():
+        return corrected.title()
+    return corrected
+
 def check_custom_dictionary(word):        
     word_lower = word.lower().strip()           # Verifica se uma palavra individual está no dicionário personalizado.
     return CUSTOM_DICTIONARY.get(word_lower)    # Retorna a correção mapeada ou None se não encontrar.    
@@ -101,6 +136,20 @@ def spell_test(word, original_score):
     if custom_result:
         return custom_result, 100 # Retorna a correção do dicionário personalizado com alta confiança
     
+    # O dicionário personalizado fica fora do cache, então alterações nele valem imediatamente
+    # Para as demais palavras, a correção depende apenas da palavra: o cache guarda o resultado dos corretores abaixo
+    key = normalize(word)
+    cache = get_cache(speller)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached, original_score
+
+    corrected = symspell_correction(key) if speller == "symspell" else consensus_correction(key)
+    cache.put(key, corrected)
+    return corrected, original_score
+
+def consensus_correction(word):
+    # Correção por consenso entre os corretores (a parte cara do spell_test, feita uma única vez por palavra)
     # 2. Verificar no SpellChecker, (mais basico)
     spell_checker_result = spell_checker.correction(word)
     if spell_checker_result is None:
@@ -132,7 +181,7 @@ def spell_test(word, original_score):
     valid_results = [result for result in results if result is not None and isinstance(result, str)]
     
     if not valid_results: 
-        return word, original_score # Se nenhum corretor sugeriu algo, retorna original com confiança original baseada no OCR
+        return word # Se nenhum corretor sugeriu algo, retorna original (com a confiança original baseada no OCR)
     
     # Contar frequência dos resultados
     result_counts = Counter(valid_results)
@@ -140,9 +189,9 @@ def spell_test(word, original_score):
 
     # Se houver consenso entre os corretores, aplica a correção mas mantém o score original do OCR
     if most_common[0][1] >= 2 or (spell_checker_result != word and spell_checker_result != most_common[0][0]):
-        return most_common[0][0], original_score  # Corrige mas mantém score OCR
+        return most_common[0][0]  # Corrige mas mantém score OCR
     
-    return word, original_score  # Mantém tudo original
+    return word  # Mantém tudo original
 
 
 # === função responsavel por corrigir as palavras do OCR via corretores ortograficos ===
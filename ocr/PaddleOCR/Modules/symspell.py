@@ -0,0 +1,205 @@
+'''
+Informações: Módulo symspell.py com um corretor por índice de deleções simétricas (algoritmo SymSpell).
+Em vez de gerar na consulta todas as edições de distância 2 da palavra (como o pyspellchecker), o índice guarda as deleções
+de cada palavra do dicionário, calculadas uma única vez. Uma consulta gera apenas as deleções da palavra de entrada, busca
+essas deleções no índice e verifica os candidatos com a distância de Damerau-Levenshtein.
+Antes das deleções, a palavra é procurada diretamente no dicionário (palavra correta, distância 0) e sem acentos
+(o OCR costuma perder os acentos: "pao" -> "pão"), o que resolve a maior parte das consultas sem verificar candidatos.
+O índice é gravado em arquivos .npy e aberto por memory map, sendo compartilhado entre execuções e entre os workers.
+'''
+
+import hashlib, os, shutil, tempfile, time, unicodedata
+import numpy as np
+
+INDEX_VERSION = 2       # Incrementar quando o formato dos arquivos mudar
+MAX_DISTANCE = 2        # Distância máxima de edição aceita na correção
+PREFIX_LENGTH = 7       # Só as deleções do prefixo são indexadas: palavras longas não multiplicam o tamanho do índice
+
+def word_hash(text):
+    # Hash de 64 bits estável entre processos (o hash() do Python muda a cada execução)
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+def strip_accents(word):
+    # Remove os acentos (decomposição NFD sem as marcas combinantes): "pão" -> "pao"
+    return "".join(c for c in unicodedata.normalize("NFD", word) if not unicodedata.combining(c))
+
+def deletes(word, max_distance=MAX_DISTANCE):
+    # Todas as strings obtidas removendo até max_distance caracteres da palavra (incluindo a própria palavra)
+    result = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))}
+        result |= frontier
+    return result
+
+def damerau_distance(a, b, max_distance=MAX_DISTANCE):
+    # Distância de Damerau-Levenshtein (transposições adjacentes), ou max_distance + 1 se passar do limite
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > max_distance:     # Nenhum caminho volta para dentro do limite
+            return max_distance + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+def build_index(frequencies, out_dir, max_distance=MAX_DISTANCE, prefix_length=PREFIX_LENGTH):
+    # Constrói o índice a partir de {palavra: frequência} e grava os arquivos .npy em out_dir
+    words = sorted(w for w in frequencies if w)
+    freqs = np.array([frequencies[w] for w in words], dtype=np.int64)
+
+    encoded = [w.encode("utf-8") for w in words]
+    offsets = np.zeros(len(words) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    lengths = np.array([len(w) for w in words], dtype=np.int16)
+
+    hashes, ids = [], []
+    for word_id, word in enumerate(words):
+        for d in deletes(word[:prefix_length], max_distance):
+            hashes.append(word_hash(d))
+            ids.append(word_id)
+    hashes = np.array(hashes, dtype=np.uint64)
+    ids = np.array(ids, dtype=np.int32)
+    order = np.argsort(hashes, kind="stable")       # Ordenado para a busca binária (searchsorted) na consulta
+
+    # Busca direta: hash da palavra e hash da palavra sem acentos, cada um apontando para a palavra.
+    # Sem acentos, várias palavras caem no mesmo hash: ficam ordenadas da mais frequente para a menos frequente
+    exact = np.array([word_hash(w) for w in words], dtype=np.uint64)
+    exact_order = np.argsort(exact, kind="stable")
+    folded = np.array([word_hash(strip_accents(w)) for w in words], dtype=np.uint64)
+    folded_order = np.lexsort((-freqs, folded))
+
+    # Grava em um diretório temporário e renomeia no final, para que outro processo nunca abra um índice incompleto
+    parent = os.path.dirname(out_dir)
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix=".symspell_")
+    np.save(os.path.join(tmp_dir, "hashes.npy"), hashes[order])
+    np.save(os.path.join(tmp_dir, "ids.npy"), ids[order])
+    np.save(os.path.join(tmp_dir, "words.npy"), blob)
+    np.save(os.path.join(tmp_dir, "offsets.npy"), offsets)
+    np.save(os.path.join(tmp_dir, "lengths.npy"), lengths)
+    np.save(os.path.join(tmp_dir, "freqs.npy"), freqs)
+    np.save(os.path.join(tmp_dir, "exact_hashes.npy"), exact[exact_order])
+    np.save(os.path.join(tmp_dir, "exact_ids.npy"), exact_order.astype(np.int32))
+    np.save(os.path.join(tmp_dir, "folded_hashes.npy"), folded[folded_order])
+    np.save(os.path.join(tmp_dir, "folded_ids.npy"), folded_order.astype(np.int32))
+    try:
+        os.rename(tmp_dir, out_dir)
+    except OSError:                 # Outro worker terminou primeiro: usa o índice dele
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+class SymSpellIndex:
+    def __init__(self, index_dir, max_distance=MAX_DISTANCE, prefix_length=PREFIX_LENGTH):
+        load = lambda name: np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r")
+        self.hashes = load("hashes")
+        self.ids = load("ids")
+        self.words = load("words")
+        self.offsets = load("offsets")
+        self.lengths = load("lengths")
+        self.freqs = load("freqs")
+        self.exact_hashes = load("exact_hashes")
+        self.exact_ids = load("exact_ids")
+        self.folded_hashes = load("folded_hashes")
+        self.folded_ids = load("folded_ids")
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+
+    def word(self, word_id):
+        return bytes(self.words[self.offsets[word_id]:self.offsets[word_id + 1]]).decode("utf-8")
+
+    def find(self, hashes, ids, key, match):
+        # Primeira palavra com o hash da chave que satisfaz match (descarta as colisões de hash), ou None
+        h = np.uint64(word_hash(key))
+        pos = int(np.searchsorted(hashes, h, side="left"))
+        while pos < len(hashes) and hashes[pos] == h:
+            candidate = self.word(ids[pos])
+            if match(candidate):
+                return candidate
+            pos += 1
+        return None
+
+    def lookup(self, word):
+        # Retorna (palavra do dicionário, distância) mais próxima, ou None se não houver nenhuma dentro de max_distance
+        word = word.lower()
+
+        # 1. A própria palavra está no dicionário
+        if self.find(self.exact_hashes, self.exact_ids, word, lambda candidate: candidate == word) is not None:
+            return word, 0
+
+        # 2. A palavra difere de uma palavra do dicionário apenas pelos acentos (a mais frequente delas)
+        folded = strip_accents(word)
+        candidate = self.find(
+            self.folded_hashes, self.folded_ids, folded, lambda candidate: strip_accents(candidate) == folded
+        )
+        if candidate is not None:
+            distance = damerau_distance(word, candidate, self.max_distance)
+            if distance <= self.max_distance:
+                return candidate, distance
+
+        # 3. Deleções. A palavra exata já foi descartada, então a menor distância possível é 1
+        prefix = word[:self.prefix_length]
+        seen = set()
+        best, best_key = None, None
+
+        # As deleções são consultadas por nível (0, 1 e 2 caracteres removidos da entrada): um candidato encontrado
+        # apenas no nível k está a pelo menos k edições, então a busca para quando não houver como melhorar nem empatar
+        # (no empate vence a palavra mais frequente, que pode estar no nível seguinte)
+        for level in range(self.max_distance + 1):
+            if best is not None and best[1] < level:
+                break
+            level_deletes = [d for d in deletes(prefix, level) if len(prefix) - len(d) == level]
+            keys = np.array([word_hash(d) for d in level_deletes], dtype=np.uint64)
+            left = np.searchsorted(self.hashes, keys, side="left")
+            right = np.searchsorted(self.hashes, keys, side="right")
+            hit = right > left
+            if not hit.any():
+                continue
+
+            candidates = np.unique(np.concatenate([self.ids[l:r] for l, r in zip(left[hit], right[hit])]))
+            candidates = candidates[np.abs(self.lengths[candidates] - len(word)) <= self.max_distance]
+            # Do mais frequente para o menos frequente: depois que um candidato é aceito, os seguintes só vencem
+            # com distância menor, então a verificação usa um limite cada vez mais apertado e para na distância 1
+            candidates = candidates[np.argsort(-self.freqs[candidates], kind="stable")]
+
+            for word_id in candidates:
+                if best is not None:
+                    if best[1] <= 1 and int(self.freqs[word_id]) <= -best_key[1]:
+                        break
+                    limit = best[1] if int(self.freqs[word_id]) > -best_key[1] else best[1] - 1
+                else:
+                    limit = self.max_distance
+                if word_id in seen or abs(int(self.lengths[word_id]) - len(word)) > limit:
+                    continue
+                seen.add(word_id)
+                candidate = self.word(word_id)
+                distance = damerau_distance(word, candidate, limit)
+                if distance > limit:
+                    continue
+                key = (distance, -int(self.freqs[word_id]))     # Menor distância e, no empate, a palavra mais frequente
+                if best_key is None or key < best_key:
+                    best, best_key = (candidate, distance), key
+        return best
+
+    def correction(self, word):
+        # Correção no mesmo formato do SpellChecker.correction: a palavra sugerida ou None
+        found = self.lookup(word)
+        return found[0] if found else None
+
+def load_index(frequencies, cache_dir, signature=""):
+    # Abre o índice de cache_dir, construindo-o na primeira vez. A assinatura identifica o conteúdo do dicionário,
+    # então qualquer alteração nas palavras gera um índice novo
+    tag = hashlib.blake2b(signature.encode("utf-8"), digest_size=4).hexdigest()
+    index_dir = os.path.join(cache_dir, f"symspell_v{INDEX_VERSION}_{tag}")
+    if not os.path.isdir(index_dir):
+        start = time.time()
+        print("[Info] Construindo o índice SymSpell (apenas na primeira execução)...")
+        build_index(frequencies(), index_dir)
+        print(f"[Info] Índice SymSpell construído em {time.time() - start:.1f} s: {index_dir}")
+    return SymSpellIndex(index_dir)
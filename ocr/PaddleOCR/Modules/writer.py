@@ -0,0 +1,59 @@
+'''
+Informações: Módulo writer.py com uma thread de escrita em segundo plano, usada para renderizar e gravar arquivos de saída
+(imagens plotadas, .txt) sem bloquear o OCR da próxima imagem.
+Cada processo (principal ou worker do Pool) possui o seu próprio writer, finalizado automaticamente na saída do processo.
+'''
+
+import atexit, queue, threading
+from multiprocessing import util
+
+class BackgroundWriter:
+    def __init__(self, max_pending=4):
+        self._queue = queue.Queue(maxsize=max_pending)  # Fila limitada: se a escrita atrasar, o OCR espera em vez de acumular imagens na memória
+        self._thread = threading.Thread(target=self._run, name="BackgroundWriter", daemon=True)
+        self._thread.start()
+        self._closed = False
+
+    def submit(self, fn, *args):
+        # Agenda fn(*args) para ser executada na thread de escrita
+        self._queue.put((fn, args))
+
+    def flush(self):
+        # Aguarda todas as tarefas agendadas terminarem
+        self._queue.join()
+
+    def close(self):
+        # Finaliza a thread após concluir as tarefas pendentes (pode ser chamada mais de uma vez)
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                fn, args = item
+                fn(*args)
+            except Exception as e:
+                print(f"[Erro] Falha na escrita em segundo plano: {e}")
+            finally:
+                self._queue.task_done()
+
+_writer = None  # Writer do processo atual, criado sob demanda
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        _writer = BackgroundWriter()
+        atexit.register(_writer.close)                                  # Processo principal
+        util.Finalize(None, _writer.close, exitpriority=10)             # Workers do Pool não executam atexit, mas executam os finalizadores do multiprocessing
+    return _writer
+
+def flush_writer():
+    # Aguarda as escritas pendentes do processo atual, se houver um writer ativo
+    if _writer is not None:
+        _writer.flush()
@@ -31,6 +31,12 @@ def help():
       --nospell        Desativa o corretor ortográfico.
       --nojson         Desativa o módulo de processamento de json
       --disable-all    Desativa todas as opções acima.
+      --notxt          Desativa a saída em .txt (os tokens seguem em memória para o JSON).
+      --render MODO    Plotagem: full (padrão, grava a imagem plotada em segundo plano), lazy (apenas quando exibida no EasyGUI) ou none.
+      --no-plot        Equivalente a --render none: nenhuma figura, plotagem ou PNG (modo de produção em lote).
+      --pipeline MODO  full (padrão): detector PP-OCRv3 completo + reconhecimento PP-OCRv4; det: somente detecção PP-OCRv3 + reconhecimento PP-OCRv4.
+      --workers N      Processa as imagens em lote com N processos paralelos (cada um carrega seus próprios modelos).
+      --speller MOTOR  consensus (padrão): pyspellchecker + autocorrect com cache; symspell: índice de deleções pré-calculado (mais rápido).
           
     Exemplos:
         python3.12 PaddleGUI.py                         # Utiliza o EasyGUI para selecionar imagens e com feedback em imagens plotadas (segure ctrl para selecionar multiplas imagens)
@@ -39,6 +45,10 @@ def help():
         python3.12 PaddleGUI.py image2.jpg --nospell    # Processa uma imagem sem corretor ortográfico [no spellchecker]
         python3.12 PaddleGUI.py image3.jpg --nojson     # Processa uma imagem sem saída em JSON [no json]        
         python3.12 PaddleGUI.py images/ --disable-all   # Processa todas as imagens em um diretório sem corretor ortográfico e sem json
+        python3.12 PaddleGUI.py images/ --no-plot       # Processa todas as imagens sem gerar a imagem plotada (somente txt e JSON)
+        python3.12 PaddleGUI.py images/ --pipeline det  # Processa todas as imagens com apenas uma passada de reconhecimento (PP-OCRv4)
+        python3.12 PaddleGUI.py images/ --speller symspell  # Processa todas as imagens corrigindo as palavras pelo índice SymSpell
+        python3.12 PaddleGUI.py images/ --workers 8     # Processa todas as imagens em um diretório com 8 processos em paralelo
         python3.12 PaddleGUI.py --help                  # Exibe este menu de ajuda
           """)
     exit()                              # Sai do programa após exibir a ajuda    
@@ -69,6 +79,47 @@ def main():
             elif '--nojson' in args:                # O argumento --nojson desativa a saída em JSON e remove o argumento da lista
                 img_proc.jsonoutput = False 
                 args.remove('--nojson')                
+
+        if '--notxt' in args:                       # O argumento --notxt desativa a gravação do .txt e remove o argumento da lista
+            img_proc.txtoutput = False
+            args.remove('--notxt')
+
+        if '--no-plot' in args:                     # O argumento --no-plot desativa toda a plotagem (mesmo que --render none)
+            img_proc.render = "none"
+            args.remove('--no-plot')
+        elif '--render' in args:                    # O argumento --render MODO define quando a imagem plotada é gerada (none, lazy ou full)
+            idx = args.index('--render')
+            if idx + 1 >= len(args) or args[idx + 1].startswith('--'):    # Sem valor ou seguido de outra opção
+                raise ValueError("modo de plotagem inválido: (ausente) (use --render none, lazy ou full)")
+            if args[idx + 1] not in ("none", "lazy", "full"):
+                raise ValueError(f"modo de plotagem inválido: {args[idx + 1]} (use none, lazy ou full)")
+            img_proc.render = args[idx + 1]
+            del args[idx:idx + 2]
+
+        if '--pipeline' in args:                    # O argumento --pipeline MODO escolhe entre o fluxo completo (full) ou apenas detecção + PP-OCRv4 (det)
+            idx = args.index('--pipeline')
+            if idx + 1 >= len(args) or args[idx + 1].startswith('--'):    # Sem valor ou seguido de outra opção
+                raise ValueError("modo de pipeline inválido: (ausente) (use --pipeline full ou det)")
+            if args[idx + 1] not in ("full", "det"):
+                raise ValueError(f"modo de pipeline inválido: {args[idx + 1]} (use full ou det)")
+            img_proc.pipeline = args[idx + 1]
+            del args[idx:idx + 2]
+
+        if '--speller' in args:                     # O argumento --speller MOTOR escolhe o corretor ortográfico (consensus ou symspell)
+            idx = args.index('--speller')
+            if idx + 1 >= len(args) or args[idx + 1].startswith('--'):    # Sem valor ou seguido de outra opção
+                raise ValueError("corretor inválido: (ausente) (use --speller consensus ou symspell)")
+            if args[idx + 1] not in ("consensus", "symspell"):
+                raise ValueError(f"corretor inválido: {args[idx + 1]} (use consensus ou symspell)")
+            img_proc.speller = args[idx + 1]
+            del args[idx:idx + 2]
+
+        if '--workers' in args:                     # O argumento --workers N ativa o modo em lote com N processos e remove o argumento e seu valor da lista
+            idx = args.index('--workers')
+            if idx + 1 >= len(args) or not args[idx + 1].isdigit() or int(args[idx + 1]) < 1:
+                raise ValueError(f"número de workers inválido: {args[idx + 1] if idx + 1 < len(args) else '(ausente)'} (use --workers N, com N >= 1)")
+            img_proc.workers = int(args[idx + 1])
+            del args[idx:idx + 2]
         
         if args:                                # Se houver argumentos, processa-os como caminhos de imagem ou diretório  
             img_paths = []
@@ -18,9 +18,12 @@ import cv2 as cv
 from matplotlib import pyplot as plt
 import numpy as np
 import os
-
-# import sys
+import sys
 import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from functools import lru_cache
 
 """# Funções para visualização
 As funções a seguir, permitem a axibição das imagens dentro do notbook
@@ -46,14 +49,73 @@ def plot_images(imgs, figsize_in_inches=(10, 10)):
 
 red_color = (0, 0, 255)
 
+"""# Configurações de plotagem
+* none - nenhuma figura é construída e apenas o mosaico final é gravado
+* lazy - sem figuras de depuração; o mosaico é exibido e gravado somente no final
+* full - figuras de depuração e mosaico parcial a cada colagem (gravação do arquivo em segundo plano)
+
+Pode ser definido por MOSAICO_RENDER ou pelos argumentos --render=<modo> e --no-plot
+"""
+
+render = os.getenv("MOSAICO_RENDER", "full")
+for arg in sys.argv[1:]:
+    if arg == "--no-plot":
+        render = "none"
+    elif arg.startswith("--render="):
+        render = arg.split("=", 1)[1]
+if render not in ("none", "lazy", "full"):
+    print(f"Modo de plotagem inválido: {render} (use none, lazy ou full)")
+    exit()
+
+# Uma única thread de escrita: o mosaico parcial é gravado enquanto o próximo frame é processado
+writer = ThreadPoolExecutor(max_workers=1)
+pending_write = None
+
+
+def write_async(file_name, img):
+    global pending_write
+    if pending_write is not None:
+        pending_write.result()  # no máximo uma gravação pendente, evitando acumular mosaicos na memória
+    pending_write = writer.submit(cv.imwrite, file_name, img)
+
+"""# Configurações de características e matching
+* MOSAICO_FEATURES: sift (padrão) | orb | akaze - orb e akaze geram descritores binários, mais rápidos de calcular e de comparar
+* MOSAICO_MATCHER: bf (padrão) força bruta | flann - busca aproximada com KD-tree (sift) ou LSH (orb e akaze)
+* MOSAICO_CHECKS: folhas visitadas pela busca do flann; maior é mais preciso e mais lento (padrão 50)
+* MOSAICO_BLEND: sec (padrão) | base | gaussian - modo de colagem, ver stitchImages
+* MOSAICO_MASK: gaussian (padrão) | feather - pesos da colagem gaussian: gaussiana centrada no frame ou distância até a borda
+* MOSAICO_INCREMENTAL: 1 mantém as características do mosaico a partir dos frames colados, sem detectar no mosaico (padrão 0);
+  combinado com MOSAICO_PYRAMID, o nível reduzido do mosaico também é mantido assim
+* MOSAICO_PYRAMID: 1 estima a homografia em 1/4 da resolução e refina só na sobreposição prevista (padrão 0), ver find_matches_pyramid
+* MOSAICO_BAND: 1 detecta as características só na faixa de sobreposição prevista pelas colagens anteriores (padrão 0), ver BandPredictor
+"""
+
+features_kind = os.getenv("MOSAICO_FEATURES", "sift")
+matcher_kind = os.getenv("MOSAICO_MATCHER", "bf")
+flann_checks = int(os.getenv("MOSAICO_CHECKS", 50))
+incremental = os.getenv("MOSAICO_INCREMENTAL", "0") == "1"
+pyramid = os.getenv("MOSAICO_PYRAMID", "0") == "1"
+band_mode = os.getenv("MOSAICO_BAND", "0") == "1"
+blend_mode = os.getenv("MOSAICO_BLEND", "sec")
+if blend_mode not in ("sec", "base", "gaussian"):
+    print(f"Modo de colagem inválido: MOSAICO_BLEND={blend_mode} (use sec, base ou gaussian)")
+    exit()
+mask_mode = os.getenv("MOSAICO_MASK", "gaussian")
+if mask_mode not in ("gaussian", "feather"):
+    print(f"Máscara inválida: MOSAICO_MASK={mask_mode} (use gaussian ou feather)")
+    exit()
+if features_kind not in ("sift", "orb", "akaze") or matcher_kind not in ("bf", "flann"):
+    print(f"Configuração inválida: MOSAICO_FEATURES={features_kind} MOSAICO_MATCHER={matcher_kind}")
+    exit()
+
 """# Configurações de Ordem e Salto"""
 
 # op configura a ordem e o tipo de salto
 op = os.getenv("MOSAICO_ALGORISM", 4)  # 1 - ERCS ; 2 - SCS ; 3 - ERCSF ; 4 SCSF
 
-saltoFixo = os.getenv(
+saltoFixo = int(os.getenv(
     "MOSAICO_SALTO", 2
-)  # Configura tamanho de salto caso op == 3 || 4;
+))  # Configura tamanho de salto caso op == 3 || 4;
 print(op, saltoFixo)
 
 
@@ -82,11 +144,11 @@ def inicializarAlvo(op=1, frames=[]):
 
         case 3:
 
-            return (len(frames) - 1) - saltoFixo
+            return (len(frames) - 1) - max(saltoFixo, 1)  # com salto 0 o alvo inicial é o vizinho do pivô
 
         case 4:
 
-            return saltoFixo
+            return max(saltoFixo, 1)
 
         # case _:
 
@@ -153,33 +215,101 @@ O caminho de entrada pode apontar para um vídeo ou para um diretório contendo
 """
 
 
-def ler_video(path):
+"""# Fonte de frames sob demanda
+Em vez de decodificar o vídeo (ou ler o diretório) inteiro para uma lista, o FrameSource decodifica cada frame apenas
+quando ele é acessado e guarda os últimos frames já pré-processados (resize) em um cache LRU limitado.
+Ele se comporta como a lista usada pelo algoritmo: len(frames), frames[i] e del frames[a:b], mas apagar frames
+apenas remove os índices, sem tocar nos arquivos.
+* MOSAICO_STRIDE: usa um frame a cada N do vídeo ou do diretório (padrão 1)
+* MOSAICO_CACHE_FRAMES: frames pré-processados mantidos na memória (padrão 8)
+* MOSAICO_DUMP_FRAMES: 1 grava cada frame do vídeo decodificado em frames/img-XXXX.jpg (padrão 0)
+"""
+
+
+class FrameSource:
+    def __init__(self, path, stride=1, cache_size=8, dump_dir=None):
+        self.path = path
+        self.cache_size = max(1, cache_size)
+        self.dump_dir = dump_dir
+        self.preprocess = None  # função aplicada a cada frame decodificado (resize)
+        self.cache = OrderedDict()
+        self.decoded = 0
+        self.cap = None
+        self.position = 0  # próximo frame que o VideoCapture vai ler
+
+        if os.path.isfile(path):
+            self.cap = cv.VideoCapture(path)
+            if not self.cap.isOpened():
+                print("Erro ao abrir o arquivo de vídeo")
+                self.cap.release()
+                exit()
+            total = int(self.cap.get(cv.CAP_PROP_FRAME_COUNT))
+            if total <= 0:  # alguns contêineres não informam o número de frames: conta sem decodificar
+                while self.cap.grab():
+                    total += 1
+                self.cap.set(cv.CAP_PROP_POS_FRAMES, 0)
+            self.names = None
+        else:
+            self.names = sorted(i for i in os.listdir(path) if i.endswith(".jpg"))
+            total = len(self.names)
 
-    # Inicializa a captura de vídeo
-    cap = cv.VideoCapture(path)
+        self.indices = list(range(0, total, max(1, stride)))  # frames da fonte, na ordem do algoritmo
 
-    # Verifica se a captura de vídeo foi inicializada corretamente
-    if not cap.isOpened():
-        print("Erro ao abrir o arquivo de vídeo")
-        cap.release()
-        exit()
+    def __len__(self):
+        return len(self.indices)
 
-    # Lista para armazenar os frames
-    frames = []
+    def __getitem__(self, i):
+        return self.frame(self.indices[i])
 
-    # Loop para ler frames do vídeo
-    while True:
-        # Lê um frame do vídeo
-        ret, frame = cap.read()
+    def __delitem__(self, key):
+        del self.indices[key]
 
-        # Verifica se o frame foi lido corretamente
-        if not ret:
-            break
+    def keep(self, positions):
+        # Mantém apenas os frames nas posições indicadas (seleção de keyframes)
+        self.indices = [self.indices[i] for i in positions]
 
-        # Adiciona o frame à lista
-        frames.append(frame)
+    def seek(self, index):
+        # Posiciona o vídeo no frame index da fonte; avanços curtos são lidos em sequência, mais barato que o seek
+        if self.cap is None or index == self.position:
+            return
+        if self.position < index <= self.position + 32:
+            while self.position < index and self.cap.grab():
+                self.position += 1
+        else:
+            self.cap.set(cv.CAP_PROP_POS_FRAMES, index)
+            self.position = index
 
-    return frames
+    def decode(self, index):
+        if self.cap is None:
+            img_path = os.path.join(self.path, self.names[index])
+            print(img_path)
+            return cv.imread(img_path)
+
+        self.seek(index)
+        ret, frame = self.cap.read()
+        if not ret:
+            print(f"Erro ao ler o frame {index} do vídeo")
+            exit()
+        self.position = index + 1
+        if self.dump_dir is not None:
+            cv.imwrite(os.path.join(self.dump_dir, f"img-{index:04}.jpg"), frame)
+            print(f"img-{index:04}")
+        return frame
+
+    def frame(self, index):
+        img = self.cache.get(index)
+        if img is not None:
+            self.cache.move_to_end(index)
+            return img
+
+        img = self.decode(index)
+        self.decoded += 1
+        if self.preprocess is not None:
+            img = self.preprocess(img)
+        self.cache[index] = img
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)  # descarta o frame usado há mais tempo
+        return img
 
 
 def alinhamento(frame, pontos_inicio):
@@ -209,26 +339,25 @@ def alinhamento(frame, pontos_inicio):
 
 
 def treat_input(path):
+    stride = int(os.getenv("MOSAICO_STRIDE", 1))
+    cache_size = int(os.getenv("MOSAICO_CACHE_FRAMES", 8))
     if os.path.isfile(path):
         if path.lower().endswith((".mp4", ".avi")):
-            print("é um video: separar os frames e colocar na pasta frames")
+            print("é um video: os frames são decodificados sob demanda")
 
-            frames = ler_video(path)
-            cont = 0
-            for frame in frames:
-                cv.imwrite(f"frames/img-{cont:04}.jpg", frame)
-                print(f"img-{cont:04}")
-                cont += 1
+            dump_dir = None
+            if os.getenv("MOSAICO_DUMP_FRAMES", "0") == "1":
+                dump_dir = "frames"
+                os.makedirs(dump_dir, exist_ok=True)
+            frames = FrameSource(path, stride, cache_size, dump_dir)
+        else:
+            print(f"Formato de entrada não suportado: {path}")
+            exit()
 
     else:
         print("é um conjunto de imagens: ler as imagens em sequencia")
 
-        names = [i for i in os.listdir(path) if i.endswith(".jpg")]
-        frames = []
-        for name in sorted(names):
-            img_path = os.path.join(path, name)
-            print(img_path)
-            frames.append(cv.imread(img_path))
+        frames = FrameSource(path, stride, cache_size)
 
         # frames = [ cv.rotate(frame, cv.ROTATE_90_CLOCKWISE) for frame in frames]
 
@@ -256,6 +385,116 @@ path = os.getenv("MOSAICO_PATH", "caminho/padrao/")
 print(path)
 frames = treat_input(path)
 # frames = treat_input("video-02.mp4")
+
+"""# Seleção de keyframes
+Antes do stitching, cada frame é avaliado em uma cópia reduzida em tons de cinza:
+* nitidez - variância do Laplaciano (frames borrados têm pouca energia nas altas frequências)
+* deslocamento - correlação de fase (phaseCorrelate) entre frames consecutivos, acumulada em uma trajetória
+A seleção percorre a trajetória e, a partir de cada keyframe, escolhe o frame mais nítido entre os que ainda têm
+a sobreposição mínima com ele e que já avançaram o suficiente para não serem redundantes. Os frames borrados só são
+usados quando não há alternativa. O stitching percorre apenas os frames selecionados.
+* MOSAICO_KEYFRAMES: 1 ativa a seleção (padrão 0)
+* MOSAICO_OVERLAP: sobreposição mínima entre keyframes consecutivos, em fração do frame (padrão 0.7)
+
+Keyframes consecutivos podem estar a até 1 - MOSAICO_OVERLAP de um frame um do outro, então um salto de 2 keyframes
+(o salto padrão) chega perto de um frame inteiro e perde a sobreposição: o matching falha e o reajustarAlvo volta de um
+em um, calculando SIFT e matching para frames que são descartados. Com a seleção ativa, os keyframes são percorridos
+um a um (salto 0), a menos que MOSAICO_SALTO seja definido explicitamente. Com salto 0, um keyframe que não casa com o
+mosaico é descartado e o stitching segue para o próximo.
+"""
+
+
+def frame_scores(frames, width=320):
+    # Nitidez de cada frame, posição acumulada (em fração da largura e da altura do frame) e trecho da trajetória:
+    # quando a correlação não tem pico, o deslocamento é desconhecido e a trajetória recomeça em um novo trecho
+    window = None
+    prev = None
+    sharpness, positions, segments = [], [], []
+    x = y = 0.0
+    segment = 0
+    for i in range(len(frames)):
+        img = frames.decode(frames.indices[i])  # decodifica sem passar pelo cache de frames pré-processados
+        h, w = img.shape[:2]
+        small = cv.resize(img, (width, int(h * width / w)), interpolation=cv.INTER_AREA)
+        gray = np.float32(cv.cvtColor(small, cv.COLOR_BGR2GRAY))
+        sharpness.append(cv.Laplacian(gray, cv.CV_32F).var())
+
+        if prev is not None:
+            if window is None:
+                window = cv.createHanningWindow(gray.shape[::-1], cv.CV_32F)
+            (dx, dy), response = cv.phaseCorrelate(prev, gray, window)
+            if response < 0.05:  # correlação sem pico
+                segment += 1
+            else:
+                x += dx / gray.shape[1]
+                y += dy / gray.shape[0]
+        positions.append((x, y))
+        segments.append(segment)
+        prev = gray
+    return np.array(sharpness), np.array(positions), np.array(segments)
+
+
+def selecionar_keyframes(sharpness, positions, segments, overlap=0.7, blur=0.5):
+    # Retorna as posições dos keyframes, em ordem
+    n = len(sharpness)
+    if n == 0:
+        return []
+    max_step = 1 - overlap  # deslocamento máximo entre keyframes para manter a sobreposição
+    nitido = sharpness >= blur * np.median(sharpness)
+
+    def distancia(a, b):
+        if segments[a] != segments[b]:
+            return np.inf  # entre trechos diferentes não há como saber a sobreposição
+        return np.abs(positions[a] - positions[b]).max()
+
+    # Primeiro keyframe: o mais nítido entre os primeiros frames ainda próximos do início. A busca para no primeiro
+    # frame que se afasta, para que um frame tardio que volte perto do início não descarte todos os anteriores
+    inicio = [0]
+    for j in range(1, n):
+        if distancia(j, 0) > max_step / 2:
+            break
+        inicio.append(j)
+    selected = [max(inicio, key=lambda j: sharpness[j])]
+    while True:
+        last = selected[-1]
+        alcance = []
+        for j in range(last + 1, n):
+            if distancia(j, last) > max_step:
+                break
+            alcance.append(j)
+        avancaram = [j for j in alcance if distancia(j, last) >= max_step / 4]  # abaixo disso o frame repete o anterior
+
+        if not avancaram:
+            proximo = last + len(alcance) + 1  # primeiro frame fora do alcance
+            if proximo >= n:
+                break  # os frames restantes repetem o último keyframe
+            selected.append(proximo)  # movimento maior que o permitido: o frame é usado mesmo assim
+            continue
+
+        candidatos = [j for j in avancaram if nitido[j]] or avancaram
+        selected.append(max(candidatos, key=lambda j: sharpness[j]))
+    return selected
+
+
+if os.getenv("MOSAICO_KEYFRAMES", "0") == "1":
+    start = time.perf_counter()
+    sharpness, positions, segments = frame_scores(frames)
+    keyframes = selecionar_keyframes(
+        sharpness, positions, segments, overlap=float(os.getenv("MOSAICO_OVERLAP", 0.7))
+    )
+    for i in range(len(frames)):
+        marca = "*" if i in keyframes else " "
+        print(
+            f"{marca} frame {frames.indices[i]:4d}: nitidez {sharpness[i]:8.1f} "
+            f"posição ({positions[i][0]:+.2f}, {positions[i][1]:+.2f}) trecho {segments[i]}"
+        )
+    print(
+        f"Keyframes: {len(keyframes)} de {len(frames)} frames em {time.perf_counter() - start:.1f} s"
+    )
+    frames.keep(keyframes)
+    if "MOSAICO_SALTO" not in os.environ:
+        saltoFixo = 0  # os keyframes já estão espaçados: percorre um a um
+        print(f"Salto entre keyframes: {saltoFixo}")
 idx_base = inicializarPivo(op, frames)
 idx_sec = inicializarAlvo(op, frames)  # alvo
 print(idx_base, idx_sec)
@@ -312,7 +551,7 @@ def contraste(img):
 
 # frames = [ sharpening(img)  for img in frames ]
 # frames = [ contraste(img)   for img in frames ]
-frames = [resize(img) for img in frames]
+frames.preprocess = resize  # aplicado sob demanda, quando cada frame é lido
 
 """# Encontrar características
 Encontra características usando SIFT
@@ -335,12 +574,19 @@ def find_doc_mask(img):
 # Gerada por IA
 
 
-def create_roi_mask(image_shape, side="left", ratio=0.5):
+def create_roi_mask(image_shape, side="left", ratio=0.5, polygon=None, margin=0):
     h, w = image_shape[:2]
     mask = np.zeros((h, w), dtype=np.uint8)  # Cria uma imagem preta
     pixel_width = int(w * ratio)  # Define a largura da busca baseada na porcentagem
 
-    if side == "left":
+    if polygon is not None:
+        # Pinta de branco o polígono (convexo, em coordenadas da imagem) alargado pela margem
+        limite = 4 * max(h, w)  # evita coordenadas enormes perto do horizonte de uma homografia
+        cv.fillConvexPoly(mask, np.int32(np.round(np.clip(polygon, -limite, limite))).reshape(-1, 2), 255)
+        if margin > 0:
+            mask = cv.dilate(mask, cv.getStructuringElement(cv.MORPH_RECT, (2 * margin + 1, 2 * margin + 1)))
+
+    elif side == "left":
         # Pinta de branco apenas o lado esquerdo
         mask[:, :pixel_width] = 255
 
@@ -366,40 +612,194 @@ def get_featured_image(img, kp):
     return img
 
 
-def find_matches(base_image, sec_image, threshold, debug_draw, min_matches=10):
-    sift = cv.SIFT_create()
+"""# Cache de características
+O detector SIFT é criado uma única vez e as características de cada imagem são calculadas uma única vez.
+Os frames são identificados pelo índice ("frame", i) e o mosaico, que muda a cada colagem, pela versão ("mosaico", v).
+Cada entrada guarda apenas arrays compactos: os pontos em float32 (N x 2) e os descritores (float32 no SIFT, uint8 nos binários).
+As características de uma imagem reduzida (pirâmide) ficam na chave com a escala, ex.: ("frame", i, 0.25), e os pontos
+são guardados sempre nas coordenadas da imagem original.
+Com uma região (roi), a detecção é feita apenas no retângulo que a contém: o custo do SIFT acompanha a área processada.
+O cache não tem limite de tamanho porque as entradas são removidas assim que deixam de ser usadas: o frame colado e a
+versão anterior do mosaico depois de cada colagem, o frame base depois da primeira colagem e cada frame descartado quando
+o alvo passa para outro frame. Ficam no cache apenas o mosaico atual e o alvo atual (peak mostra o máximo de entradas).
+"""
 
-    sec_image_mask = find_doc_mask(sec_image)
-    base_image_mask = find_doc_mask(base_image)
 
-    base_image_kp, base_image_des = sift.detectAndCompute(base_image, base_image_mask)
-    sec_image_kp, sec_image_des = sift.detectAndCompute(sec_image, sec_image_mask)
+def detect_features(detector, img, roi=None, scale=1):
+    x = y = 0
+    if roi is not None:
+        x, y, w, h = cv.boundingRect(roi)
+        if w == 0 or h == 0:
+            return np.zeros((0, 2), np.float32), None
+        img = img[y : y + h, x : x + w]
+        mask = cv.bitwise_and(find_doc_mask(img), roi[y : y + h, x : x + w])
+    else:
+        mask = find_doc_mask(img)
+    if scale != 1:
+        img = cv.resize(img, None, fx=scale, fy=scale, interpolation=cv.INTER_AREA)
+        mask = cv.resize(mask, (img.shape[1], img.shape[0]), interpolation=cv.INTER_NEAREST)
+
+    kp, des = detector.detectAndCompute(img, mask)
+    pts = np.float32(cv.KeyPoint_convert(kp)).reshape(-1, 2)
+    if scale != 1:
+        pts /= scale
+    if x or y:
+        pts += np.float32([x, y])
+    return pts, des
+
+
+def restrict_features(entry, roi):
+    # Mantém apenas os pontos (e descritores) dentro da região
+    pts, des = entry
+    h, w = roi.shape[:2]
+    xs = np.clip(pts[:, 0].astype(np.int64), 0, w - 1)
+    ys = np.clip(pts[:, 1].astype(np.int64), 0, h - 1)
+    keep = roi[ys, xs] > 0
+    return pts[keep], (des[keep] if des is not None else None)
+
+
+class FeatureCache:
+    def __init__(self, detector):
+        self.detector = detector
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.peak = 0       # Maior número de entradas guardadas ao mesmo tempo
+
+    def describe(self, key, img, roi=None, scale=1):
+        # Retorna (pontos, descritores) da imagem, calculando apenas na primeira vez que a chave aparece.
+        # Com roi, usa a entrada do cache filtrada pela região ou detecta só na região (sem guardar no cache)
+        if key is not None and scale != 1:
+            key = key + (scale,)
+        entry = self.entries.get(key) if key is not None else None
+        if entry is not None:
+            self.hits += 1
+            return entry if roi is None else restrict_features(entry, roi)
+
+        self.misses += 1
+        entry = detect_features(self.detector, img, roi, scale)
+        if key is not None and roi is None:
+            self.store(key, entry)
+        return entry
+
+    def store(self, key, entry):
+        # Guarda características calculadas fora do detector (mosaico incremental)
+        self.entries[key] = entry
+        self.peak = max(self.peak, len(self.entries))
+
+    def forget(self, key):
+        # Remove a chave em todas as escalas
+        for k in [k for k in self.entries if k[:2] == key]:
+            del self.entries[k]
+
+    def delete_frames(self, start, stop=None):
+        # Acompanha um del frames[start:stop]: remove os frames apagados e desloca os índices dos frames seguintes
+        entries = {}
+        for key, entry in self.entries.items():
+            kind, idx = key[:2]
+            if kind != "frame" or idx < start:
+                entries[key] = entry
+            elif stop is not None and idx >= stop:
+                entries[(kind, idx - (stop - start)) + key[2:]] = entry
+        self.entries = entries
+
+
+def create_detector(kind):
+    match kind:
+        case "sift":
+            return cv.SIFT_create()
+        case "orb":
+            return cv.ORB_create(nfeatures=10000)  # o padrão (500) não chega ao min_matches dos cupons
+        case "akaze":
+            if not hasattr(cv, "AKAZE_create"):  # fora do módulo principal em algumas versões do OpenCV
+                print("AKAZE não está disponível nesta instalação do OpenCV")
+                exit()
+            return cv.AKAZE_create()
+
+
+def create_matcher(kind, binary, checks=50):
+    if kind == "flann":
+        if binary:
+            # FLANN_INDEX_LSH: tabelas de hash para descritores binários
+            index_params = dict(algorithm=6, table_number=6, key_size=12, multi_probe_level=1)
+        else:
+            # FLANN_INDEX_KDTREE: árvores k-d aleatórias para descritores float32
+            index_params = dict(algorithm=1, trees=5)
+        return cv.FlannBasedMatcher(index_params, dict(checks=checks))
+
+    # Força bruta: distância de Hamming para descritores binários e L2 para o SIFT
+    return cv.BFMatcher(cv.NORM_HAMMING) if binary else cv.BFMatcher()
+
+
+features = FeatureCache(create_detector(features_kind))
+matcher = create_matcher(matcher_kind, binary=features_kind != "sift", checks=flann_checks)
+
+
+def find_matches(
+    base_image,
+    sec_image,
+    threshold,
+    debug_draw,
+    min_matches=10,
+    base_key=None,
+    sec_key=None,
+    base_roi=None,
+    sec_roi=None,
+    scale=1,
+    guide=None,
+):
+    start = time.perf_counter()
+    base_image_kp, base_image_des = features.describe(base_key, base_image, base_roi, scale)
+    sec_image_kp, sec_image_des = features.describe(sec_key, sec_image, sec_roi, scale)
+    detect_time = time.perf_counter() - start
 
     if debug_draw:
         plot_images(
             [
-                get_featured_image(base_image, kp=base_image_kp),
-                get_featured_image(sec_image, kp=sec_image_kp),
+                get_featured_image(base_image, kp=cv.KeyPoint_convert(base_image_kp)),
+                get_featured_image(sec_image, kp=cv.KeyPoint_convert(sec_image_kp)),
             ]
         )
 
-    brute_force_matcher = (
-        cv.BFMatcher()
-    )  #  match images can be used either FLANN or BFMatcher methods that OpenCV provides - https://docs.opencv.org/3.1.0/dc/dc3/tutorial_py_matcher.html
-    all_matches = brute_force_matcher.knnMatch(
-        base_image_des, sec_image_des, k=2
-    )  # k=2 return the two best matches for every descriptor
+    if base_image_des is None or sec_image_des is None or len(sec_image_des) < 2:
+        print("Not enough matches are found - 0/%d" % min_matches)
+        return (None, None, None)
 
-    # filter all matches found to get the best ones
-    good_matches = []
-    for m, n in all_matches:
-        if m.distance < threshold * n.distance:
-            good_matches.append(m)
+    if guide is not None:
+        # Homografia aproximada conhecida: cada ponto só é comparado com os vizinhos previstos
+        start = time.perf_counter()
+        good_matches = guided_matches(
+            base_image_kp, base_image_des, sec_image_kp, sec_image_des, guide, threshold
+        )
+        match_time = time.perf_counter() - start
+    else:
+        start = time.perf_counter()
+        all_matches = matcher.knnMatch(
+            base_image_des, sec_image_des, k=2
+        )  # k=2 return the two best matches for every descriptor
+        match_time = time.perf_counter() - start
+
+        # filter all matches found to get the best ones
+        # (o LSH pode devolver menos de dois vizinhos para um descritor)
+        good_matches = []
+        for pair in all_matches:
+            if len(pair) == 2 and pair[0].distance < threshold * pair[1].distance:
+                good_matches.append(pair[0])
+
+    nivel = f" (escala {scale})" if scale != 1 else " (sobreposição)" if base_roi is not None else ""
+    print(
+        f"{features_kind}/{matcher_kind}{nivel}: {len(base_image_kp)} x {len(sec_image_kp)} pontos, "
+        f"{len(good_matches)} matches bons - detecção {detect_time:.2f} s, matching {match_time:.2f} s"
+    )
 
     if len(good_matches) >= min_matches:
         if debug_draw:
             draw_matches(
-                good_matches, base_image, sec_image, base_image_kp, sec_image_kp
+                good_matches,
+                base_image,
+                sec_image,
+                cv.KeyPoint_convert(base_image_kp),
+                cv.KeyPoint_convert(sec_image_kp),
             )
         return (good_matches, base_image_kp, sec_image_kp)
     else:
@@ -407,18 +807,256 @@ def find_matches(base_image, sec_image, threshold, debug_draw, min_matches=10):
         return (None, None, None)
 
 
-while 1:
+"""# Encontrando a homografia
+A Homografia é uma operação matricial que modifica pontos de um plano, levando-os a outro plano
+"""
+
+
+def find_homography(kp1, kp2, matches):
+    # kp1 e kp2 são os arrays de pontos (N x 2) do FeatureCache
+    src_pts = kp1[[m.queryIdx for m in matches]].reshape(-1, 1, 2)
+    dst_pts = kp2[[m.trainIdx for m in matches]].reshape(-1, 1, 2)
+    (H, _) = cv.findHomography(dst_pts, src_pts, cv.RANSAC, ransacReprojThreshold=50)
+    return H
+
+
+def homografia_valida(homography, sec_image_shape, min_area=0.25, max_area=4):
+    # Descarta homografias degeneradas: os cantos do frame transformados precisam formar um quadrilátero convexo
+    # com área comparável à do frame (matches errados aceitos pelo RANSAC dobram ou colapsam a imagem)
+    if homography is None:
+        return False
+    h, w = sec_image_shape[:2]
+    corners = np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2)
+    warped = cv.perspectiveTransform(corners, homography)
+    area = cv.contourArea(warped) / (w * h)
+    return cv.isContourConvex(warped) and min_area <= area <= max_area
+
+
+"""# Homografia em pirâmide (MOSAICO_PYRAMID)
+As características são detectadas primeiro nas imagens reduzidas a 1/4 (1/16 da área), onde o SIFT é muito mais rápido,
+e uma homografia aproximada é estimada com elas. Essa homografia prevê a sobreposição entre as imagens: o frame
+transformado sobre a imagem base e a imagem base transformada de volta sobre o frame.
+Na resolução original, as características são detectadas apenas nessa sobreposição, alargada por uma margem que
+absorve o erro da estimativa. O matching também é guiado: a imagem base é dividida em blocos e os pontos de cada bloco
+só são comparados com os pontos do frame que a homografia aproximada leva para o mesmo bloco (com a margem), em vez de
+todos contra todos. A homografia final é calculada com esses matches.
+Se a estimativa ou o refinamento falharem, o par é comparado na resolução original inteira, como sem a pirâmide.
+"""
+
+PYRAMID_SCALE = 0.25
+PYRAMID_MARGIN = 64  # pixels na resolução original
+PYRAMID_TILE = 256  # lado dos blocos do matching guiado
+
+
+def image_corners(shape):
+    h, w = shape[:2]
+    return np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2)
+
+
+def overlap_masks(homography, base_image_shape, sec_image_shape, margin=PYRAMID_MARGIN):
+    # Regiões de cada imagem que a homografia (frame -> base) prevê sobrepostas
+    base_polygon = cv.perspectiveTransform(image_corners(sec_image_shape), homography)
+    sec_polygon = cv.perspectiveTransform(image_corners(base_image_shape), np.linalg.inv(homography))
+    return (
+        create_roi_mask(base_image_shape, polygon=base_polygon, margin=margin),
+        create_roi_mask(sec_image_shape, polygon=sec_polygon, margin=margin),
+    )
+
+
+def guided_matches(base_pts, base_des, sec_pts, sec_des, homography, threshold, tile=PYRAMID_TILE, margin=PYRAMID_MARGIN):
+    predicted = cv.perspectiveTransform(sec_pts.reshape(-1, 1, 2), homography).reshape(-1, 2)
+    base_tiles = np.floor(base_pts / tile).astype(np.int64)
+
+    good_matches = []
+    for tx, ty in np.unique(base_tiles, axis=0):
+        query = np.flatnonzero((base_tiles[:, 0] == tx) & (base_tiles[:, 1] == ty))
+        x0, y0 = tx * tile - margin, ty * tile - margin
+        train = np.flatnonzero(
+            (predicted[:, 0] >= x0)
+            & (predicted[:, 0] < x0 + tile + 2 * margin)
+            & (predicted[:, 1] >= y0)
+            & (predicted[:, 1] < y0 + tile + 2 * margin)
+        )
+        if len(train) < 2:
+            continue
+        # O teste da razão é feito entre os vizinhos do bloco; os índices voltam para os arrays completos
+        for pair in matcher.knnMatch(base_des[query], sec_des[train], k=2):
+            if len(pair) == 2 and pair[0].distance < threshold * pair[1].distance:
+                m = pair[0]
+                good_matches.append(cv.DMatch(int(query[m.queryIdx]), int(train[m.trainIdx]), m.distance))
+    return good_matches
+
+
+def find_matches_pyramid(
+    base_image,
+    sec_image,
+    threshold,
+    debug_draw,
+    min_matches=10,
+    base_key=None,
+    sec_key=None,
+    base_roi=None,
+    sec_roi=None,
+):
+    # Na imagem reduzida há bem menos pontos, então o mínimo de matches da estimativa é menor
     matches, base_image_kp, sec_image_kp = find_matches(
+        base_image,
+        sec_image,
+        threshold,
+        debug_draw=False,
+        min_matches=max(10, min_matches // 8),
+        base_key=base_key,
+        sec_key=sec_key,
+        base_roi=base_roi,
+        sec_roi=sec_roi,
+        scale=PYRAMID_SCALE,
+    )
+    H = find_homography(base_image_kp, sec_image_kp, matches) if matches is not None else None
+    if homografia_valida(H, sec_image.shape):
+        # O refinamento depende do par (região prevista): os frames já no cache são filtrados pela região
+        base_overlap, sec_overlap = overlap_masks(H, base_image.shape, sec_image.shape)
+        if base_roi is not None:
+            base_overlap = cv.bitwise_and(base_overlap, base_roi)
+        if sec_roi is not None:
+            sec_overlap = cv.bitwise_and(sec_overlap, sec_roi)
+        matches, base_image_kp, sec_image_kp = find_matches(
+            base_image,
+            sec_image,
+            threshold,
+            debug_draw,
+            min_matches,
+            base_key,
+            sec_key,
+            base_roi=base_overlap,
+            sec_roi=sec_overlap,
+            guide=H,
+        )
+        if matches is not None:
+            return matches, base_image_kp, sec_image_kp
+
+    print("Pirâmide: estimativa falhou, comparando na resolução original")
+    return find_matches(
+        base_image,
+        sec_image,
+        threshold,
+        debug_draw,
+        min_matches,
+        base_key,
+        sec_key,
+        base_roi=base_roi,
+        sec_roi=sec_roi,
+    )
+
+
+match_pair = find_matches_pyramid if pyramid else find_matches
+
+
+"""# Faixa de sobreposição prevista (MOSAICO_BAND)
+Antes de comparar o mosaico com o próximo frame, a sobreposição entre eles é prevista a partir das colagens anteriores:
+o movimento entre os dois últimos frames colados (homografia do frame novo para o anterior) é repetido a partir da
+posição do último frame no mosaico, proporcional ao salto até o próximo alvo. O salto segue a ordem configurada em op:
+nos modos com salto fixo (ERCSF e SCSF) é o próprio salto, e nos modos por metades (ERCS e SCS) é a distância até o
+meio dos frames restantes; quando um frame é descartado e o alvo volta uma posição, a faixa prevista acompanha.
+As características são detectadas apenas nessa faixa (alargada por uma margem) na imagem base e no frame.
+O primeiro par, sem colagem anterior, é comparado inteiro; se a faixa não tiver matches suficientes, o par também
+é comparado inteiro, então a faixa nunca descarta um frame que seria colado sem ela.
+"""
+
+BAND_MARGIN = 0.15  # margem da faixa, em fração do maior lado do frame
+
+
+def translation(offset):
+    return np.array([[1, 0, offset[0]], [0, 1, offset[1]], [0, 0, 1]], dtype=np.float64)
+
+
+class BandPredictor:
+    def __init__(self, margin=BAND_MARGIN):
+        self.placement = None  # Homografia do último frame colado para o mosaico
+        self.motion = None  # Homografia do último frame colado para o anterior
+        self.step = None  # Salto (em frames) entre os dois últimos frames colados
+        self.margin = margin
+
+    def update(self, placement, correction, step=None):
+        # Registra o frame colado: placement já está nas coordenadas do mosaico novo, que foi deslocado por correction.
+        # Com salto 0 (o mesmo frame colado de novo) o movimento anterior é mantido
+        if self.placement is not None and step != 0:
+            previous = translation(correction) @ self.placement
+            self.motion = np.linalg.inv(previous) @ placement
+            self.step = step
+        self.placement = placement
+
+    def masks(self, base_image_shape, sec_image_shape, step):
+        # Faixas previstas na imagem base e no frame, ou (None, None) quando ainda não há como prever
+        if self.motion is None or not step or not self.step:
+            return None, None
+
+        # Movimento proporcional ao salto (interpolação linear da homografia, adequada a movimentos pequenos)
+        motion = self.motion / self.motion[2, 2]
+        motion = np.eye(3) + (step / self.step) * (motion - np.eye(3))
+        corners = image_corners(sec_image_shape)
+        sec_polygon = cv.perspectiveTransform(corners, self.placement @ motion)
+        if not cv.isContourConvex(sec_polygon):
+            return None, None
+
+        margin = int(self.margin * max(sec_image_shape[:2]))
+        # Na base, a faixa fica dentro do último frame colado, que é o que se sobrepõe ao próximo
+        base_roi = cv.bitwise_and(
+            create_roi_mask(base_image_shape, polygon=sec_polygon, margin=margin),
+            create_roi_mask(base_image_shape, polygon=cv.perspectiveTransform(corners, self.placement)),
+        )
+        sec_roi = create_roi_mask(
+            sec_image_shape, polygon=cv.perspectiveTransform(corners, np.linalg.inv(motion)), margin=margin
+        )
+        return base_roi, sec_roi
+
+
+def find_matches_band(
+    base_image,
+    sec_image,
+    threshold,
+    debug_draw,
+    min_matches=10,
+    base_key=None,
+    sec_key=None,
+    base_roi=None,
+    sec_roi=None,
+):
+    if base_roi is not None:
+        found = match_pair(
+            base_image,
+            sec_image,
+            threshold,
+            debug_draw,
+            min_matches,
+            base_key,
+            sec_key,
+            base_roi=base_roi,
+            sec_roi=sec_roi,
+        )
+        if found[0] is not None:
+            return found
+        print("Faixa: matches insuficientes na sobreposição prevista, comparando as imagens inteiras")
+    return match_pair(base_image, sec_image, threshold, debug_draw, min_matches, base_key, sec_key)
+
+
+while 1:
+    matches, base_image_kp, sec_image_kp = match_pair(
         frames[idx_base],
         frames[idx_sec],
         threshold=0.7,
-        debug_draw=True,
+        debug_draw=render == "full",
         min_matches=100,
+        base_key=("frame", idx_base),
+        sec_key=("frame", idx_sec),
     )
     if matches != None:
         break
     else:
-        idx_sec = reajustarAlvo(op, frames, idx_sec)
+        features.forget(("frame", idx_sec))  # O alvo descartado não volta a ser comparado
+        if saltoFixo == 0 and op in (3, 4):
+            idx_sec = ajustarAlvo(op, frames, idx_sec)  # sem frames intermediários para voltar: tenta o próximo
+        else:
+            idx_sec = reajustarAlvo(op, frames, idx_sec)
 
 # if op == 1:
 
@@ -431,18 +1069,6 @@ while 1:
 # idx_base = len(frames) - 1  # pivo
 # idx_sec = math.floor(len(frames) / 2)  # alvo
 
-"""# Encontrando a homografia
-A Homografia é uma operação matricial que modifica pontos de um plano, levando-os a outro plano
-"""
-
-
-def find_homography(kp1, kp2, matches):
-    src_pts = np.float32([kp1[m.queryIdx].pt for m in matches]).reshape(-1, 1, 2)
-    dst_pts = np.float32([kp2[m.trainIdx].pt for m in matches]).reshape(-1, 1, 2)
-    (H, _) = cv.findHomography(dst_pts, src_pts, cv.RANSAC, ransacReprojThreshold=50)
-    return H
-
-
 H = find_homography(base_image_kp, sec_image_kp, matches)
 # print(H)
 
@@ -519,38 +1145,91 @@ Aplica a homografia ajustada para depois colar as imagens em um mosaico resultan
 
 # Função para criar uma máscara gaussiana
 def gaussian_mask(shape, sigma=500):
-    """Cria uma máscara gaussiana bidimensional normalizada."""
+    """Cria uma máscara gaussiana bidimensional normalizada (float32, somente leitura)."""
     h, w = shape[:2]
+    return _gaussian_mask(h, w, sigma)
+
+
+@lru_cache(maxsize=8)
+def _gaussian_mask(h, w, sigma):
+    # Os frames têm poucos tamanhos depois do resize: a máscara de cada (tamanho, sigma) é calculada uma única vez.
+    # exp(-(x² + y²) / 2σ²) = exp(-x² / 2σ²) * exp(-y² / 2σ²): produto externo de duas gaussianas 1D
+    y = np.arange(h, dtype=np.float32) - h // 2  # Coordenadas centradas
+    x = np.arange(w, dtype=np.float32) - w // 2
+    gy = np.exp(-(y**2) / np.float32(2 * sigma**2))
+    gx = np.exp(-(x**2) / np.float32(2 * sigma**2))
+    mask = np.outer(gy / gy.max(), gx / gx.max())  # Normaliza para [0, 1]
+    mask.setflags(write=False)  # compartilhada entre as chamadas: não pode ser alterada
+    return mask
 
-    # Coordenadas centradas
-    y, x = np.meshgrid(np.arange(h) - h // 2, np.arange(w) - w // 2, indexing="ij")
 
-    mask = np.exp(-(x**2 + y**2) / (2 * sigma**2))
-    return mask / mask.max()  # Normaliza para [0, 1]
+def feather_mask(footprint):
+    """Pesos pela distância até a borda da área útil (footprint != 0), normalizados para [0, 1]."""
+    mask = np.zeros(footprint.shape[:2], dtype=np.float32)
+    x, y, w, h = cv.boundingRect(footprint)
+    if w == 0 or h == 0:
+        return mask
 
+    # A distância é calculada apenas no retângulo que contém a área útil, com uma borda preta de 1 px
+    # para que os pesos caiam a zero também na borda do retângulo
+    sub = cv.copyMakeBorder(footprint[y : y + h, x : x + w], 1, 1, 1, 1, cv.BORDER_CONSTANT, value=0)
+    dist = cv.distanceTransform(sub, cv.DIST_L2, 3)[1:-1, 1:-1]
+    mask[y : y + h, x : x + w] = dist / max(float(dist.max()), 1.0)
+    return mask
 
-def cola_imagens(base_image, mask_base, stitched_image, mask_sec):
 
-    mask1 = mask_base
-    mask2 = mask_sec
+def footprint_of(img):
+    # Área útil de uma imagem já posicionada na moldura: pixels que não são pretos
+    gray = img if img.ndim == 2 else img.max(axis=2)
+    return np.where(gray != 0, 255, 0).astype(np.uint8)
 
-    # Expandir dimensões para corresponder aos 3 canais (RGB)
-    mask1 = mask1[:, :, np.newaxis]
-    mask2 = mask2[:, :, np.newaxis]
+
+def frame_mask(img):
+    # Máscara de pesos de uma imagem para a colagem. None quando não é necessária: colagens sem mistura
+    # ou máscaras por distância, que são calculadas no stitchImages já com a imagem na posição final
+    if blend_mode != "gaussian" or mask_mode == "feather":
+        return None
+    return gaussian_mask(img.shape)
+
+
+def cola_imagens(base_image, mask_base, stitched_image, mask_sec, out=None):
+    # Mistura as duas imagens com os pesos das máscaras, em float32, gravando em out (ou em uma imagem nova)
+
+    mask1 = mask_base.astype(np.float32, copy=False)
+    mask2 = mask_sec.astype(np.float32, copy=False)
 
     # Ajustar as máscaras para que a soma seja igual a 1
-    mask2 = (1 - mask1 + mask2) / 2
-    mask1 = 1 - mask2
+    peso2 = (1 - mask1 + mask2) / 2
+    peso1 = 1 - peso2
 
-    mask1 = np.where(mask_sec[:, :, np.newaxis] == 0, 1, mask1)
-    mask2 = np.where(mask_base[:, :, np.newaxis] == 0, 1, mask2)
+    peso1[mask2 == 0] = 1
+    peso2[mask1 == 0] = 1
 
-    resultado = (base_image * mask1 + stitched_image * mask2).astype(np.uint8)
+    # Expandir dimensões para corresponder aos 3 canais (RGB)
+    resultado = base_image.astype(np.float32)
+    resultado *= peso1[:, :, np.newaxis]
+    segunda = stitched_image.astype(np.float32)
+    segunda *= peso2[:, :, np.newaxis]
+    resultado += segunda
+    np.clip(resultado, 0, 255, out=resultado)
+
+    if out is None:
+        return resultado.astype(np.uint8)
+    out[...] = resultado
+    return out
+
+
+"""# Modos de colagem (MOSAICO_BLEND)
+* sec (padrão) - o frame novo fica por cima: o mosaico anterior só aparece onde o frame novo é preto
+* base - o mosaico anterior fica por cima: o frame novo só aparece onde o mosaico é preto
+* gaussian - mistura as duas imagens com as máscaras gaussianas
+Apenas o modo escolhido é calculado, direto na região do mosaico anterior (ROI) dentro da nova moldura.
+"""
 
-    return resultado
 
+def stitchImages(base_image, sec_image, homography, mask_base, mask_sec, blend=None):
+    blend = blend or blend_mode
 
-def stitchImages(base_image, sec_image, homography, mask_base, mask_sec):
     # Finding size of new frame of stitched images and updating the homography matrix
     new_frame_size, correction, homographyMatrix = new_frame_size_and_matrix(
         homography,
@@ -562,71 +1241,145 @@ def stitchImages(base_image, sec_image, homography, mask_base, mask_sec):
     stitched_image = cv.warpPerspective(
         sec_image, homographyMatrix, (new_frame_size[1], new_frame_size[0])
     )
-    mask_sec = cv.warpPerspective(
-        mask_sec, homographyMatrix, (new_frame_size[1], new_frame_size[0])
-    )
+    if blend != "gaussian":
+        mask_sec = None  # só a mistura gaussiana usa as máscaras
+    elif mask_mode == "feather":
+        # Pesos calculados apenas dentro da área do frame depois de transformado
+        footprint = cv.warpPerspective(
+            np.full(sec_image.shape[:2], 255, dtype=np.uint8),
+            homographyMatrix,
+            (new_frame_size[1], new_frame_size[0]),
+            flags=cv.INTER_NEAREST,
+        )
+        mask_sec = feather_mask(footprint)
+        if mask_base is None:
+            mask_base = feather_mask(footprint_of(base_image))
+    else:
+        if mask_sec is None:
+            mask_sec = gaussian_mask(sec_image.shape)
+        if mask_base is None:
+            mask_base = gaussian_mask(base_image.shape)
+        mask_sec = cv.warpPerspective(
+            mask_sec, homographyMatrix, (new_frame_size[1], new_frame_size[0])
+        )
 
-    st_img_1 = stitched_image.copy()  # cola primeira na segunda
-    st_img_2 = stitched_image.copy()  # cola segunda na primeira
-    st_img_3 = (
-        stitched_image.copy()
-    )  # cola primeira e segunda usando máscaras gaussianas
-
-    st_img_2[
-        correction[1] : correction[1] + base_image.shape[0],
-        correction[0] : correction[0] + base_image.shape[1],
-    ] = np.where(
-        stitched_image[
-            correction[1] : correction[1] + base_image.shape[0],
-            correction[0] : correction[0] + base_image.shape[1],
-        ]
-        != 0,
-        stitched_image[
-            correction[1] : correction[1] + base_image.shape[0],
-            correction[0] : correction[0] + base_image.shape[1],
-        ],
-        base_image,
+    # Única cópia da moldura inteira: o stitched_image continua sendo devolvido sem a colagem
+    mosaico = stitched_image.copy()
+    roi = (
+        slice(correction[1], correction[1] + base_image.shape[0]),
+        slice(correction[0], correction[0] + base_image.shape[1]),
     )
+    mosaico_roi = mosaico[roi]  # view: as operações abaixo alteram o mosaico
+
+    match blend:
+        case "sec":  # cola segunda na primeira
+            np.copyto(mosaico_roi, base_image, where=mosaico_roi == 0)
+        case "base":  # cola primeira na segunda
+            np.copyto(mosaico_roi, base_image, where=base_image != 0)
+        case "gaussian":  # cola primeira e segunda usando máscaras gaussianas
+            # Fora da ROI a base é preta com peso zero, e o resultado é o próprio stitched_image
+            cola_imagens(
+                base_image,
+                mask_base,
+                mosaico_roi,
+                mask_sec[roi],
+                out=mosaico_roi,
+            )
 
-    st_img_1[
-        correction[1] : correction[1] + base_image.shape[0],
-        correction[0] : correction[0] + base_image.shape[1],
-    ] = np.where(
-        base_image != 0,
-        base_image,
-        stitched_image[
-            correction[1] : correction[1] + base_image.shape[0],
-            correction[0] : correction[0] + base_image.shape[1],
-        ],
+    return mosaico, stitched_image, mask_sec
+
+
+"""# Características incrementais do mosaico
+Em vez de detectar as características no mosaico inteiro a cada colagem (custo que cresce com a área do mosaico),
+os pontos do frame colado, já calculados no cache, são levados para as coordenadas do mosaico pela mesma homografia
+usada na colagem e unidos aos pontos do mosaico. Os descritores são reaproveitados sem alteração.
+Para não acumular pontos repetidos nas regiões sobrepostas, o mosaico é dividido em uma grade e, em cada célula
+ocupada pelo frame novo, os pontos antigos são descartados (o frame mais recente é o que se sobrepõe ao próximo).
+Com a pirâmide (MOSAICO_PYRAMID), o nível reduzido do mosaico é mantido da mesma forma a partir das características
+reduzidas do frame, que a estimativa já calculou: sem isso, o nível reduzido seria detectado no mosaico inteiro a cada
+colagem. A grade acompanha a escala, para que cada célula tenha aproximadamente a mesma área da imagem reduzida.
+"""
+
+
+def grid_cells(pts, cell):
+    cells = np.floor(pts / cell).astype(np.int64)
+    return (cells[:, 1] << 32) + cells[:, 0]
+
+
+def merge_features(mosaic_entry, frame_entry, homography, correction, cell=32):
+    mosaic_pts, mosaic_des = mosaic_entry
+    frame_pts, frame_des = frame_entry
+
+    # O mosaico é deslocado pela correção da nova moldura e o frame é transformado pela homografia ajustada
+    mosaic_pts = mosaic_pts + np.float32(correction)
+    frame_pts = cv.perspectiveTransform(frame_pts.reshape(-1, 1, 2), homography).reshape(-1, 2)
+
+    keep = ~np.isin(grid_cells(mosaic_pts, cell), grid_cells(frame_pts, cell))
+    if mosaic_des is None:
+        return frame_pts, frame_des
+    if frame_des is None:
+        return mosaic_pts[keep], mosaic_des[keep]
+    return (
+        np.vstack([mosaic_pts[keep], frame_pts]),
+        np.vstack([mosaic_des[keep], frame_des]),
     )
 
-    nova_base = np.zeros(stitched_image.shape, dtype=np.uint8)
-    nova_base[
-        correction[1] : correction[1] + base_image.shape[0],
-        correction[0] : correction[0] + base_image.shape[1],
-    ] = base_image
-    # criar uma nova_base_mask
-    nova_base_mask = np.zeros(nova_base.shape[:2], dtype=np.float64)
-    nova_base_mask[
-        correction[1] : correction[1] + mask_base.shape[0],
-        correction[0] : correction[0] + mask_base.shape[1],
-    ] = mask_base
-    st_img_3 = cola_imagens(nova_base, nova_base_mask, stitched_image, mask_sec)
 
-    return st_img_2, stitched_image, mask_sec
+def update_mosaic_features(mosaic_entry, frame_entry, homography, sec_image_shape, base_image_shape, cell=32):
+    # Mesma moldura e homografia ajustada calculadas pelo stitchImages
+    _, correction, homographyMatrix = new_frame_size_and_matrix(
+        homography, sec_image_shape=sec_image_shape, base_image_shape=base_image_shape
+    )
+    return merge_features(mosaic_entry, frame_entry, homographyMatrix, correction, cell)
+
+
+def store_mosaic_features(version, mosaic_entry, frame_key, frame, homography, base_image_shape):
+    # Guarda as características da versão nova do mosaico em cada escala usada no matching.
+    # mosaic_entry(scale) retorna as características da versão anterior (ou do frame base) na escala
+    for scale in (1, PYRAMID_SCALE) if pyramid else (1,):
+        entry = update_mosaic_features(
+            mosaic_entry(scale),
+            features.describe(frame_key, frame, scale=scale),
+            homography,
+            frame.shape[:2],
+            base_image_shape,
+            cell=32 / scale,
+        )
+        features.store(("mosaico", version) + ((scale,) if scale != 1 else ()), entry)
 
 
 result_file_name = "mosaico.jpg"
+band = BandPredictor()
+if band_mode:
+    # O frame base entra no mosaico apenas deslocado pela correção da moldura
+    _, correction, placement = new_frame_size_and_matrix(
+        H, sec_image_shape=frames[idx_sec].shape[:2], base_image_shape=frames[idx_base].shape[:2]
+    )
+    band.update(translation(correction), (0, 0))
+    band.update(placement, (0, 0), abs(idx_sec - idx_base))
+ultimo = idx_sec  # Índice do último frame colado (o salto até o próximo alvo define a faixa prevista)
 mosaico, _, _ = stitchImages(
     base_image=frames[idx_base],
     sec_image=frames[idx_sec],
     homography=H,
-    mask_base=gaussian_mask(frames[idx_base].shape),
-    mask_sec=gaussian_mask(frames[idx_sec].shape),
+    mask_base=frame_mask(frames[idx_base]),
+    mask_sec=frame_mask(frames[idx_sec]),
 )
 print("mosaico")
-plot_image(mosaico)
-cv.imwrite(result_file_name, mosaico)
+if incremental:
+    # O frame base entra no mosaico sem homografia (apenas a correção da moldura)
+    store_mosaic_features(
+        0,
+        lambda scale: features.describe(("frame", idx_base), frames[idx_base], scale=scale),
+        ("frame", idx_sec),
+        frames[idx_sec],
+        H,
+        frames[idx_base].shape[:2],
+    )
+features.forget(("frame", idx_base))  # O pivô já está no mosaico e não é comparado de novo
+if render == "full":
+    plot_image(mosaico)
+    write_async(result_file_name, mosaico)
 
 """# Cria um mosaico olhando para imagens visinhas
 Considerando img1 e img2 como imagens "visinhas", o mosaico será construido modificando a img2 para colar na img1.
@@ -654,9 +1407,10 @@ O resultado é devolvido com a composição das duas
 
 # [ x, x, Alvo, x , Pivo] Vamos tentar colar imagens distantes
 img1 = mosaico  # Pivo
-mask_img1 = gaussian_mask(img1.shape)
+mask_img1 = frame_mask(img1)
 
 alvo = inicializarAlvo(op, frames)
+versao = 0  # Versão do img1: muda a cada colagem e identifica as suas características no cache
 
 
 while 1:
@@ -665,12 +1419,37 @@ while 1:
     print(alvo)
     img2 = frames[alvo]
 
-    matches, base_image_kp, sec_image_kp = find_matches(
-        img1, img2, 0.75, debug_draw=True, min_matches=150
+    base_roi = sec_roi = None
+    if band_mode:
+        base_roi, sec_roi = band.masks(mosaico.shape, img2.shape, abs(alvo - ultimo))
+        if incremental:
+            sec_roi = None  # o frame é descrito inteiro de qualquer forma para entrar no mosaico incremental
+    matches, base_image_kp, sec_image_kp = find_matches_band(
+        mosaico if incremental else img1,
+        img2,
+        0.75,
+        debug_draw=render == "full",
+        min_matches=150,
+        base_key=("mosaico", versao),
+        sec_key=("frame", alvo),
+        base_roi=base_roi,
+        sec_roi=sec_roi,
     )
+    if matches != None:
+        H = find_homography(base_image_kp, sec_image_kp, matches)
+        if not homografia_valida(H, img2.shape):
+            print("Homografia degenerada - frame descartado")
+            matches = None
+
     if matches == None:
 
-        alvo = reajustarAlvo(op, frames, alvo)  # Volte uma imagem
+        features.forget(("frame", alvo))  # O frame descartado não é comparado de novo com este mosaico
+        if saltoFixo == 0 and op in (3, 4):
+            # Sem salto, voltar uma imagem cai no frame já colado e o mesmo alvo seria tentado de novo para sempre:
+            # o frame é descartado e o próximo é tentado
+            alvo = ajustarAlvo(op, frames, alvo)
+        else:
+            alvo = reajustarAlvo(op, frames, alvo)  # Volte uma imagem
 
         print(len(frames))
         print(alvo)
@@ -682,8 +1461,21 @@ while 1:
         else:
             continue  # Volte ao início do loop
 
-    H = find_homography(base_image_kp, sec_image_kp, matches)
-    mask_img2 = gaussian_mask(img2.shape)
+    mask_img2 = frame_mask(img2)
+    if band_mode:
+        _, correction, placement = new_frame_size_and_matrix(
+            H, sec_image_shape=img2.shape[:2], base_image_shape=mosaico.shape[:2]
+        )
+        band.update(placement, correction, abs(alvo - ultimo))
+    if incremental:
+        store_mosaic_features(
+            versao + 1,
+            lambda scale: features.describe(("mosaico", versao), mosaico, scale=scale),
+            ("frame", alvo),
+            img2,
+            H,
+            mosaico.shape[:2],
+        )
     mosaico, img1, mask_img1 = stitchImages(
         base_image=mosaico,
         sec_image=img2,
@@ -691,15 +1483,35 @@ while 1:
         mask_base=mask_img1,
         mask_sec=mask_img2,
     )
-    plot_image(mosaico)
-    cv.imwrite(result_file_name, mosaico)
+    # O img1 mudou e o frame já foi colado: as características antigas não serão mais usadas
+    features.forget(("mosaico", versao))
+    features.forget(("frame", alvo))
+    versao += 1
+    if render == "full":
+        plot_image(mosaico)
+        write_async(result_file_name, mosaico)
 
     if op == 1:
         del frames[alvo:]
+        features.delete_frames(alvo)
     elif op == 2:
         del frames[:alvo]
+        features.delete_frames(0, alvo)
+    ultimo = 0 if op == 2 else alvo
     alvo = ajustarAlvo(op, frames, alvo)
 
     if alvo == -1:  # Alvo == Pivo
         print("Finalizando")
         break
+
+print(
+    f"Características: {features.misses} calculadas, {features.hits} reaproveitadas, "
+    f"no máximo {features.peak} imagens em cache"
+)
+print(f"Frames decodificados: {frames.decoded}")
+
+# Gravação final do mosaico (em todos os modos)
+writer.shutdown(wait=True)
+cv.imwrite(result_file_name, mosaico)
+if render == "lazy":
+    plot_image(mosaico)